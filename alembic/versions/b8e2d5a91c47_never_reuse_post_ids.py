@@ -0,0 +1,67 @@
+"""never reuse post ids
+
+Revision ID: b8e2d5a91c47
+Revises: 66fc1442c88c
+Create Date: 2026-10-18 10:12:44.318906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2d5a91c47'
+down_revision: Union[str, Sequence[str], None] = '66fc1442c88c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Without AUTOINCREMENT SQLite hands the id of a deleted newest post to the
+# next insert, and the post watermarks behind the ETags can't tell the two
+# posts apart. Postgres sequences never go back, so this is SQLite only.
+# Rebuilding posts drops its triggers: the FTS sync ones (add_post_search_index)
+# are created again, unchanged.
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_fts_au AFTER UPDATE OF title, content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+
+def _rebuild_posts(autoincrement: bool) -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    with op.batch_alter_table(
+        'posts', recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}
+    ):
+        pass
+
+    for statement in FTS_TRIGGERS:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # copied rows keep their ids, and sqlite_sequence starts at the highest
+    _rebuild_posts(autoincrement=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild_posts(autoincrement=False)
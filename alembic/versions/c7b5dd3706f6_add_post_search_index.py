@@ -0,0 +1,90 @@
+"""add post search index
+
+Revision ID: c7b5dd3706f6
+Revises: d4c1449e30a3
+Create Date: 2026-10-18 08:35:48.926275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7b5dd3706f6'
+down_revision: Union[str, Sequence[str], None] = 'd4c1449e30a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# SQLite: an external-content FTS5 table over posts, kept in sync by triggers
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE posts_fts USING fts5(
+        title, content,
+        content='posts', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_fts_au AFTER UPDATE OF title, content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    # index the posts that already exist
+    "INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS posts_fts_au",
+    "DROP TRIGGER IF EXISTS posts_fts_ad",
+    "DROP TRIGGER IF EXISTS posts_fts_ai",
+    "DROP TABLE IF EXISTS posts_fts",
+]
+
+# Postgres: a generated tsvector column (titles weigh more) with a GIN index
+POSTGRES_UPGRADE = [
+    """
+    ALTER TABLE posts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX ix_posts_search_vector ON posts USING gin (search_vector)",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_posts_search_vector",
+    "ALTER TABLE posts DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements: dict[str, list[str]]) -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect not in statements:
+        raise NotImplementedError(f"post search is not implemented for {dialect}")
+
+    for statement in statements[dialect]:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _run({"sqlite": SQLITE_UPGRADE, "postgresql": POSTGRES_UPGRADE})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _run({"sqlite": SQLITE_DOWNGRADE, "postgresql": POSTGRES_DOWNGRADE})
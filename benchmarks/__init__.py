@@ -0,0 +1,8 @@
+"""Load tests and benchmarks for the API; see benchmarks/run.py"""
+import sys
+from pathlib import Path
+
+# the app modules live at the repository root
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,154 @@
+"""This tree against an earlier commit: same scenarios, same data, same server.
+
+    python -m benchmarks.compare --ref 5c0e632 [--ref-env KEY=VALUE ...] [--concurrency 500]
+                                 [--requests 2000] [--scenarios read_user,users_page]
+                                 [--workers 1] [--output compare.json]
+
+The app at --ref is exported with `git archive` into a temporary
+directory, and each tree is served in turn by uvicorn from its own copy
+of the seeded database. Older trees open example.db in their working
+directory and newer ones DATABASE_URL; the copy satisfies both. Only
+scenarios whose routes exist at --ref make sense to compare. --ref-env
+settings apply to the ref tree only, so --ref HEAD compares settings.
+
+The comparisons worth rerunning:
+
+    # the sync stack (5c0e632, before the async database layer) at 500 clients
+    python -m benchmarks.compare --ref 5c0e632 --concurrency 500
+    # /refresh without rotation (a lookup) and with it (UPDATE ... RETURNING
+    # plus an insert); trees before rotation fail /refresh on SQLite, where
+    # expire_at comes back without a timezone
+    python -m benchmarks.compare --ref HEAD --ref-env REFRESH_TOKEN_ROTATION=false \
+                                 --scenarios refresh --concurrency 16
+
+The report has both result sets and, per scenario, the ratios
+current / ref of throughput and p99 (above 1.0 is more throughput,
+and a slower p99).
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import ROOT
+from benchmarks.run import run_uvicorn
+from benchmarks.seed import copy_database, seed
+
+# routes every tree since the keyset pagination commit serves the same way
+DEFAULT_SCENARIOS = "read_user,read_user_posts,users_page,posts_page"
+
+
+def _git(*args: str) -> bytes:
+    return subprocess.run(["git", *args], cwd=ROOT, stdout=subprocess.PIPE, check=True).stdout
+
+def export_tree(ref: str, target: Path):
+    """The files of commit `ref` in `target`, without touching the checkout"""
+    with tarfile.open(fileobj=io.BytesIO(_git("archive", "--format=tar", ref))) as archive:
+        archive.extractall(target)
+
+def change(ref: dict, current: dict) -> dict:
+    return {
+        key: {
+            "throughput": round(current[key]["throughput_rps"] / ref[key]["throughput_rps"], 3)
+            if ref[key]["throughput_rps"] else None,
+            "p99": round(current[key]["p99_ms"] / ref[key]["p99_ms"], 3) if ref[key]["p99_ms"] else None,
+        }
+        for key in current if key in ref
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark this tree against an earlier commit")
+    parser.add_argument("--ref", required=True, help="commit to compare against")
+    parser.add_argument("--ref-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="setting for the ref tree only (repeatable)")
+    parser.add_argument("--db", default=str(ROOT / "benchmarks" / "bench.db"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--heavy-posts", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers, for both trees")
+    parser.add_argument("--concurrency", default="500", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=2000, help="per scenario and level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--output", help="write the report JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    args.scenarios = {name for name in args.scenarios.split(",") if name}
+    args.port = 0
+    ref_env = dict(setting.split("=", 1) for setting in args.ref_env)
+
+    path = os.path.abspath(args.db)
+    # same settings as benchmarks.run, for both trees
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("REAPER_INTERVAL_SECONDS", "0")
+    os.environ.setdefault("SLOW_REQUEST_SECONDS", "5")
+    os.environ.setdefault("LOGIN_RATE_LIMIT_PER_IP", "0")
+    os.environ.setdefault("MAX_PAGE_SIZE", "10000")
+
+    volumes = seed(path, args.users, args.posts, args.heavy_posts)
+    ref_commit = _git("rev-parse", args.ref).decode().strip()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-compare-") as tmp:
+        ref_dir = Path(tmp) / "ref"
+        export_tree(ref_commit, ref_dir)
+
+        for side, app_dir, copy, settings in (
+            ("ref", ref_dir, ref_dir / "example.db", ref_env),
+            ("current", ROOT, Path(tmp) / "current.db", {}),
+        ):
+            # writes of one tree must not show up in the other's reads
+            copy_database(path, str(copy))
+            env = {**os.environ, **settings, "DATABASE_URL": f"sqlite:///{copy}"}
+            print(f"{side}: {app_dir}", file=sys.stderr)
+            results[side] = asyncio.run(run_uvicorn(args, volumes, app_dir=app_dir, env=env))
+
+    report = {
+        "meta": {
+            "ref": args.ref,
+            "ref_commit": ref_commit,
+            "ref_env": ref_env,
+            "current_commit": _git("rev-parse", "HEAD").decode().strip(),
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "cpus": os.cpu_count(),
+            "volumes": volumes,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "ref": results["ref"],
+        "current": results["current"],
+        "change": change(results["ref"], results["current"]),
+    }
+
+    for key, ratios in report["change"].items():
+        ref, current = results["ref"][key], results["current"][key]
+        print(
+            f"{key:28} {ref['throughput_rps']:>9.1f} -> {current['throughput_rps']:>9.1f} req/s "
+            f"(x{ratios['throughput']})  p99 {ref['p99_ms']:>9.2f} -> {current['p99_ms']:>9.2f}ms  "
+            f"errors {ref['errors']} -> {current['errors']}",
+            file=sys.stderr
+        )
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + "\n")
+    else:
+        print(body)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""Benchmark every route against a seeded SQLite database.
+
+    python -m benchmarks.run [--users N --posts N] [--replicas N] [--mode inprocess|uvicorn --workers N]
+                             [--concurrency 1,16] [--requests 200] [--scenarios a,b]
+                             [--output results.json] [--baseline baseline.json] [--save-baseline]
+
+Each scenario (benchmarks/scenarios.py) runs at every concurrency level,
+through an in-process ASGI client or against `uvicorn --workers N`.
+Results are JSON: throughput, p50/p95/p99 latency and peak RSS per
+scenario, plus in-process micro benchmarks of token signing/verification
+and row serialization. With --baseline, a scenario whose p95 grew or
+whose throughput dropped by more than --tolerance fails the run (exit 1).
+benchmarks/compare.py runs the same scenarios against an earlier commit.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from benchmarks import ROOT
+from benchmarks.seed import make_replicas, seed
+
+
+# ------------------------------
+# Measurements
+# ------------------------------
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[index]
+
+def _own_peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _tree_peak_rss_mb(pid: int) -> Optional[float]:
+    """Sum of peak RSS (VmHWM) of `pid` and its descendants; Linux only"""
+    proc = Path("/proc")
+    if not proc.exists():
+        return None
+
+    children: dict[int, list[int]] = {}
+    for stat in proc.glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+
+    total, pending = 0.0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            for line in (proc / str(current) / "status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total += int(line.split()[1]) / 1024
+        except OSError:
+            continue
+
+    return total
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+# ------------------------------
+# Load generation
+# ------------------------------
+async def run_scenario(client, ctx, scenario, requests: int, concurrency: int, warmup: int) -> dict:
+    import httpx
+
+    for _ in range(warmup):
+        try:
+            await scenario.request(client, ctx, 0)
+        except httpx.HTTPError:
+            # counted as errors by the measured requests
+            pass
+
+    if scenario.max_requests is not None:
+        requests = min(requests, scenario.max_requests)
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(slot: int):
+        nonlocal errors
+        # the workers share one iterator, so together they issue `requests`
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await scenario.request(client, ctx, slot)
+                ok = response.status_code in scenario.expect
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(slot) for slot in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def login_slots(client, ctx, concurrency: int):
+    """One session per worker slot, for the authenticated scenarios"""
+    from benchmarks import scenarios
+
+    ctx.access_tokens, ctx.refresh_tokens = [], []
+    for slot in range(concurrency):
+        response = await scenarios.login(client, ctx, slot, user_id=slot % ctx.users + 1)
+        response.raise_for_status()
+        tokens = response.json()
+        ctx.access_tokens.append(tokens["access_token"])
+        ctx.refresh_tokens.append(tokens["refresh_token"])
+
+async def drive(client, args, volumes: dict, server_pid: Optional[int]) -> dict:
+    from benchmarks import scenarios
+
+    ctx = scenarios.Context(volumes["users"], volumes["posts"], volumes["heavy_posts"])
+    selected = [
+        scenario for scenario in scenarios.SCENARIOS
+        if not args.scenarios or scenario.name in args.scenarios
+    ]
+
+    results = {}
+    for concurrency in args.concurrency:
+        # a bcrypt check per slot, only paid when some scenario needs it
+        if any(scenario.authenticated for scenario in selected):
+            await login_slots(client, ctx, concurrency)
+
+        for scenario in selected:
+            result = await run_scenario(client, ctx, scenario, args.requests, concurrency, args.warmup)
+            result["peak_rss_mb"] = round(
+                _tree_peak_rss_mb(server_pid) if server_pid else _own_peak_rss_mb(), 1
+            )
+
+            key = f"{scenario.name}@c{concurrency}"
+            results[key] = result
+            print(
+                f"{key:32} {result['throughput_rps']:>10.1f} req/s  "
+                f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+                f"p99 {result['p99_ms']:>8.2f}ms  errors {result['errors']}",
+                file=sys.stderr
+            )
+
+    return results
+
+async def run_inprocess(args, volumes: dict) -> dict:
+    import httpx
+    import main
+
+    # no lifespan: the background reaper stays out of the measurements
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await drive(client, args, volumes, None)
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_uvicorn(args, volumes: dict, app_dir: Path = ROOT, env: Optional[dict] = None) -> dict:
+    """Serve the app in `app_dir` (this tree by default) with uvicorn and drive it"""
+    import httpx
+
+    port = args.port or _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=app_dir,
+        env=env or os.environ.copy()
+    )
+
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    await client.get("/stats/cache")
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("uvicorn did not come up")
+                    await asyncio.sleep(0.2)
+
+            return await drive(client, args, volumes, server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# ------------------------------
+# Micro benchmarks
+# ------------------------------
+def _ops_per_second(func, seconds: float = 1.0) -> float:
+    count = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        func()
+        count += 1
+    return round(count / elapsed, 1)
+
+def micro_benchmarks() -> dict:
+    """Hot paths below the HTTP layer, measured in this process"""
+    import schemas
+    import security
+
+    claims = {"sub": "1"}
+    token = security.create_access_token(claims)
+    uncached = security.TokenService(
+        list(security.token_service.keys.values()),
+        security.token_service.active.kid,
+        cache_size=0
+    )
+
+    rows = [
+        {"id": i, "title": f"post {i}", "content": "benchmark content " * 5, "user_id": 1}
+        for i in range(10000)
+    ]
+
+    return {
+        "jwt_sign": {"ops_per_second": _ops_per_second(lambda: security.create_access_token(claims))},
+        "jwt_verify_cached": {"ops_per_second": _ops_per_second(lambda: security.decode_access_token(token))},
+        "jwt_verify_uncached": {"ops_per_second": _ops_per_second(lambda: uncached.verify(token))},
+        "serialize_10k_rows_adapter": {"ops_per_second": _ops_per_second(lambda: schemas.post_rows.dump_json(rows))},
+        "serialize_10k_rows_models": {"ops_per_second": _ops_per_second(
+            lambda: [schemas.PostResponse.model_validate(row).model_dump_json() for row in rows]
+        )},
+    }
+
+
+# ------------------------------
+# Baseline comparison
+# ------------------------------
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `results` against `baseline`, as readable lines"""
+    regressions = []
+
+    for key, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(key)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {current['p95_ms']}ms, baseline {base['p95_ms']}ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {current['throughput_rps']} req/s, baseline {base['throughput_rps']} req/s"
+            )
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{key}: {current['errors']} errors, baseline {base['errors']}")
+
+    for key, current in results["micro"].items():
+        base = baseline.get("micro", {}).get(key)
+        if base and current["ops_per_second"] < base["ops_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {current['ops_per_second']} ops/s, baseline {base['ops_per_second']} ops/s"
+            )
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the User-Post API")
+    parser.add_argument("--db", default=str(ROOT / "benchmarks" / "bench.db"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--heavy-posts", type=int, default=10000)
+    parser.add_argument("--reseed", action="store_true")
+    parser.add_argument("--replicas", type=int, default=0, help="read from N copies of the database")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn workers")
+    parser.add_argument("--port", type=int, default=0, help="uvicorn port (default: any free one)")
+    parser.add_argument("--concurrency", default="1,16", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="per scenario and level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--scenarios", default="", help="comma-separated names (default: all)")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="fail on regressions against this results JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    args.scenarios = {name for name in args.scenarios.split(",") if name}
+
+    path = os.path.abspath(args.db)
+    # before anything imports `database`
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("REAPER_INTERVAL_SECONDS", "0")
+    # the heavier scenarios are slow by design, keep the slow request log for outliers
+    os.environ.setdefault("SLOW_REQUEST_SECONDS", "5")
+    # every request comes from this one address
+    os.environ.setdefault("LOGIN_RATE_LIMIT_PER_IP", "0")
+    # serialize_heavy_user asks for a 10k-row page
+    os.environ.setdefault("MAX_PAGE_SIZE", "10000")
+
+    volumes = seed(path, args.users, args.posts, args.heavy_posts, force=args.reseed)
+    if args.replicas:
+        os.environ["REPLICA_DATABASE_URLS"] = ",".join(
+            f"sqlite:///{copy}" for copy in make_replicas(path, args.replicas)
+        )
+
+    runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    scenarios = asyncio.run(runner(args, volumes))
+
+    results = {
+        "meta": {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "replicas": args.replicas,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "volumes": volumes,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "scenarios": scenarios,
+        "micro": micro_benchmarks(),
+        "peak_rss_mb": round(_own_peak_rss_mb(), 1),
+    }
+
+    body = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + "\n")
+    else:
+        print(body)
+
+    if args.baseline and args.save_baseline:
+        Path(args.baseline).write_text(body + "\n")
+        return 0
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""How read throughput scales with the number of serve.py workers.
+
+    python -m benchmarks.scaling [--workers 1,2,4] [--clients 4] [--concurrency 16]
+                                 [--seconds 5] [--scenarios read_user,posts_page]
+
+For each worker count, serve.py is started against the seeded database
+and every read scenario is driven for --seconds by --clients load
+generator processes (one Python process can't saturate several workers),
+each with --concurrency requests in flight. The report has throughput,
+latency percentiles and scaling efficiency: throughput / (workers *
+throughput with one worker); 1.0 is linear. Worker counts above the
+core count can't scale, meta.cpus says how many there are.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks import ROOT
+from benchmarks.run import _free_port, _tree_peak_rss_mb, summarize
+from benchmarks.seed import seed
+
+READ_SCENARIOS = "read_user,read_user_posts,users_batch,posts_batch,users_page,posts_page,search_selective"
+
+
+def _client(base_url: str, name: str, volumes: dict, seconds: float, concurrency: int, seed_value: int):
+    """One load generator process: latencies and error count of `name`"""
+    import random
+
+    import httpx
+
+    from benchmarks import scenarios
+
+    scenario = next(scenario for scenario in scenarios.SCENARIOS if scenario.name == name)
+    ctx = scenarios.Context(volumes["users"], volumes["posts"], volumes["heavy_posts"])
+    ctx.rng = random.Random(seed_value)
+
+    async def drive():
+        latencies: list[float] = []
+        errors = 0
+        limits = httpx.Limits(max_connections=concurrency)
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            deadline = time.perf_counter() + seconds
+
+            async def worker(slot: int):
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = await scenario.request(client, ctx, slot)
+                        ok = response.status_code in scenario.expect
+                    except httpx.HTTPError:
+                        ok = False
+                    latencies.append(time.perf_counter() - started)
+                    errors += not ok
+
+            await asyncio.gather(*(worker(slot) for slot in range(concurrency)))
+
+        return latencies, errors
+
+    return asyncio.run(drive())
+
+
+def _wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(f"{base_url}/stats/cache")
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("serve.py did not come up")
+            time.sleep(0.1)
+
+def run_workers(args, workers: int, volumes: dict, pool) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [
+            sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=ROOT,
+        env=os.environ.copy()
+    )
+
+    try:
+        _wait_until_up(base_url, server)
+
+        results = {}
+        for name in args.scenarios:
+            # warm every worker's pool and caches a little before measuring
+            pool.starmap(_client, [(base_url, name, volumes, 0.5, 2, 0)] * args.clients)
+
+            runs = pool.starmap(_client, [
+                (base_url, name, volumes, args.seconds, args.concurrency, seed_value)
+                for seed_value in range(1, args.clients + 1)
+            ])
+            latencies = [latency for run_latencies, _ in runs for latency in run_latencies]
+            errors = sum(run_errors for _, run_errors in runs)
+
+            result = summarize(latencies, errors, args.seconds)
+            result["peak_rss_mb"] = round(_tree_peak_rss_mb(server.pid) or 0.0, 1)
+            results[name] = result
+            print(
+                f"{name}@w{workers:<3} {result['throughput_rps']:>10.1f} req/s  "
+                f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  errors {errors}",
+                file=sys.stderr
+            )
+
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def efficiency(results: dict) -> dict:
+    """Per scenario and worker count: throughput relative to linear scaling from the smallest count"""
+    counts = sorted(results, key=int)
+    base = counts[0]
+    return {
+        name: {
+            count: round(
+                results[count][name]["throughput_rps"]
+                / (results[base][name]["throughput_rps"] * int(count) / int(base)),
+                3
+            ) if results[base][name]["throughput_rps"] else None
+            for count in counts
+        }
+        for name in results[base]
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure throughput against the number of workers")
+    parser.add_argument("--db", default=str(ROOT / "benchmarks" / "bench.db"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--heavy-posts", type=int, default=10000)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=0, help="load generator processes (default: most workers)")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight per client")
+    parser.add_argument("--seconds", type=float, default=5.0, help="per scenario and worker count")
+    parser.add_argument("--scenarios", default=READ_SCENARIOS)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    worker_counts = sorted({int(count) for count in args.workers.split(",")})
+    args.clients = args.clients or max(worker_counts)
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+
+    path = os.path.abspath(args.db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("REAPER_INTERVAL_SECONDS", "0")
+    os.environ.setdefault("SLOW_REQUEST_SECONDS", "5")
+
+    volumes = seed(path, args.users, args.posts, args.heavy_posts)
+
+    # spawn: the clients shouldn't inherit anything from this process
+    with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+        results = {str(count): run_workers(args, count, volumes, pool) for count in worker_counts}
+
+    report = {
+        "meta": {
+            "workers": worker_counts,
+            "clients": args.clients,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "cpus": os.cpu_count(),
+            "volumes": volumes,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+        "efficiency": efficiency(results),
+    }
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + "\n")
+    else:
+        print(body)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
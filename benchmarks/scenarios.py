@@ -0,0 +1,241 @@
+"""What the benchmark runner drives: one scenario per route or access pattern.
+
+Each scenario is an async function (client, ctx, slot) -> response; `slot`
+is the index of the concurrent worker issuing the request, so stateful
+flows (e.g. refresh token rotation) can keep one chain per worker.
+"""
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+import pagination
+from benchmarks.seed import SEED_PASSWORD, TAGS, WORDS, email
+
+
+@dataclass
+class Context:
+    users: int
+    posts: int
+    heavy_posts: int
+    rng: random.Random = field(default_factory=lambda: random.Random(42))
+    # per worker slot
+    access_tokens: list[str] = field(default_factory=list)
+    refresh_tokens: list[str] = field(default_factory=list)
+    # users made by create_user, consumed by delete_user
+    created_user_ids: list[int] = field(default_factory=list)
+    created: int = 0
+    # per worker slot, the next page of search_paged
+    search_cursors: dict[int, str] = field(default_factory=dict)
+    # per worker slot, posts made by create_post, consumed by delete_post
+    created_post_ids: dict[int, list[int]] = field(default_factory=dict)
+
+    def user_id(self) -> int:
+        return self.rng.randint(1, self.users)
+
+    def auth(self, slot: int) -> dict:
+        return {"Authorization": f"Bearer {self.access_tokens[slot]}"}
+
+    def unique(self) -> int:
+        self.created += 1
+        return self.created
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[httpx.AsyncClient, Context, int], Awaitable[httpx.Response]]
+    expect: tuple = (200,)
+    # cap on requests, for scenarios bound by bcrypt
+    max_requests: Optional[int] = None
+    # needs a logged-in session per worker slot (ctx.access_tokens, ctx.refresh_tokens)
+    authenticated: bool = False
+
+
+async def login(client, ctx, slot, user_id: Optional[int] = None):
+    return await client.post("/login", data={
+        "username": email(user_id or ctx.user_id()),
+        "password": SEED_PASSWORD,
+    })
+
+async def login_throttled(client, ctx, slot):
+    # wrong passwords for one account: a few bcrypt checks, then cheap 429s
+    return await client.post("/login", data={"username": email(ctx.users), "password": "wrong-password"})
+
+async def refresh(client, ctx, slot):
+    response = await client.post("/refresh", params={"refresh_token": ctx.refresh_tokens[slot]})
+    if response.status_code == 200:
+        # rotation: the next request of this slot must use the new token;
+        # without it the same token stays valid
+        ctx.refresh_tokens[slot] = response.json().get("refresh_token", ctx.refresh_tokens[slot])
+    return response
+
+async def logout(client, ctx, slot):
+    # an unknown token still runs the DELETE, without ending the slot's session
+    return await client.post("/logout", params={"refresh_token": f"unknown-{ctx.unique()}"})
+
+async def create_user(client, ctx, slot):
+    n = ctx.unique()
+    response = await client.post("/users/", json={
+        "name": f"bench {n}",
+        "email": f"bench{n}-{ctx.rng.getrandbits(32)}@new.example.com",
+        "password": SEED_PASSWORD,
+    })
+    if response.status_code == 201:
+        ctx.created_user_ids.append(response.json()["id"])
+    return response
+
+async def bulk_create_users(client, ctx, slot):
+    body = "\n".join(
+        json.dumps({
+            "name": "bulk",
+            "email": f"bulk{ctx.unique()}-{ctx.rng.getrandbits(32)}@new.example.com",
+            "password": SEED_PASSWORD,
+        })
+        for _ in range(10)
+    )
+    return await client.post("/users/bulk", content=body, headers=ctx.auth(slot))
+
+async def update_user(client, ctx, slot):
+    return await client.put(f"/users/{ctx.user_id()}", json={"name": f"renamed {ctx.unique()}"})
+
+async def delete_user(client, ctx, slot):
+    # only users made by create_user, the seeded ones are needed by the rest
+    user_id = ctx.created_user_ids.pop() if ctx.created_user_ids else 0
+    return await client.delete(f"/users/{user_id}")
+
+async def read_user(client, ctx, slot):
+    return await client.get(f"/users/{ctx.user_id()}", params={"posts_limit": 20})
+
+async def read_user_posts(client, ctx, slot):
+    return await client.get(f"/users/{ctx.user_id()}/posts")
+
+async def users_batch(client, ctx, slot):
+    # a feed's worth of users, instead of 100 GET /users/{id}
+    ids = ",".join(str(ctx.user_id()) for _ in range(100))
+    return await client.get("/users/batch", params={"ids": ids, "posts_limit": 0})
+
+async def posts_batch(client, ctx, slot):
+    ids = ",".join(str(ctx.rng.randint(1, ctx.posts)) for _ in range(100))
+    return await client.get("/posts/batch", params={"ids": ids})
+
+async def users_page(client, ctx, slot):
+    return await client.get("/users/", params={"page": ctx.rng.randint(1, 10), "posts_limit": 5})
+
+async def users_offset_deep(client, ctx, slot):
+    # the last pages: OFFSET walks past every user before them
+    last_page = max(1, ctx.users // 10)
+    return await client.get("/users/", params={"page": last_page - ctx.rng.randint(0, 9), "posts_limit": 5})
+
+async def users_cursor_deep(client, ctx, slot):
+    after = max(0, ctx.users - ctx.rng.randint(10, 100))
+    return await client.get("/users/", params={"after": pagination.encode_cursor(after), "limit": 10, "posts_limit": 5})
+
+async def posts_page(client, ctx, slot):
+    after = ctx.rng.randint(0, max(0, ctx.posts - 100))
+    return await client.get("/posts/", params={"after": pagination.encode_cursor(after), "limit": 100})
+
+async def posts_stream_tail(client, ctx, slot):
+    # streamed, unpaged: the last 10k posts
+    after = max(0, ctx.posts + ctx.heavy_posts - 10000)
+    return await client.get("/posts/", params={"after": pagination.encode_cursor(after)})
+
+async def serialize_heavy_user(client, ctx, slot):
+    # one 10k-row page of user 1's posts
+    return await client.get("/users/1/posts", params={"limit": 10000})
+
+async def search_common(client, ctx, slot):
+    # matches a large share of all posts: ranking dominates
+    return await client.get("/posts/search", params={"q": ctx.rng.choice(WORDS)})
+
+async def search_selective(client, ctx, slot):
+    return await client.get("/posts/search", params={"q": f"tag{ctx.rng.randrange(TAGS)}"})
+
+async def search_paged(client, ctx, slot):
+    # each slot walks the pages of one two-word query
+    params = {"q": "cache latency", "limit": 20}
+    if slot in ctx.search_cursors:
+        params["after"] = ctx.search_cursors[slot]
+
+    response = await client.get("/posts/search", params=params)
+    cursor = response.headers.get("x-next-cursor")
+    if cursor:
+        ctx.search_cursors[slot] = cursor
+    else:
+        ctx.search_cursors.pop(slot, None)
+    return response
+
+async def my_posts(client, ctx, slot):
+    return await client.get("/posts/me", headers=ctx.auth(slot))
+
+async def create_post(client, ctx, slot):
+    response = await client.post(
+        "/posts/",
+        json={"title": "bench", "content": f"post {ctx.unique()}"},
+        headers=ctx.auth(slot)
+    )
+    if response.status_code == 201:
+        ctx.created_post_ids.setdefault(slot, []).append(response.json()["id"])
+    return response
+
+async def delete_post(client, ctx, slot):
+    # only the slot's own posts from create_post
+    owned = ctx.created_post_ids.get(slot)
+    post_id = owned.pop() if owned else 0
+    return await client.delete(f"/posts/{post_id}", headers=ctx.auth(slot))
+
+async def bulk_create_posts(client, ctx, slot):
+    body = "\n".join(
+        json.dumps({"title": "bulk", "content": f"post {ctx.unique()}"})
+        for _ in range(100)
+    )
+    return await client.post("/posts/bulk", content=body, headers=ctx.auth(slot))
+
+async def logout_all(client, ctx, slot):
+    # ends the slot's refresh chain, hence its place after refresh
+    return await client.post("/logout/all", headers=ctx.auth(slot))
+
+async def user_stats(client, ctx, slot):
+    return await client.get("/stats/users", params={"top": 10})
+
+async def cache_stats(client, ctx, slot):
+    return await client.get("/stats/cache")
+
+async def metrics(client, ctx, slot):
+    return await client.get("/metrics")
+
+
+# in run order: writers that feed later scenarios come first
+SCENARIOS = [
+    Scenario("login", login, max_requests=100),
+    Scenario("login_throttled", login_throttled, expect=(400, 429)),
+    Scenario("refresh", refresh, authenticated=True),
+    Scenario("logout", logout),
+    Scenario("create_user", create_user, expect=(201,), max_requests=100),
+    Scenario("bulk_create_users", bulk_create_users, max_requests=20, authenticated=True),
+    Scenario("update_user", update_user),
+    Scenario("delete_user", delete_user, expect=(204, 404), max_requests=100),
+    Scenario("read_user", read_user),
+    Scenario("read_user_posts", read_user_posts),
+    Scenario("users_batch", users_batch),
+    Scenario("posts_batch", posts_batch),
+    Scenario("users_page", users_page),
+    Scenario("users_offset_deep", users_offset_deep),
+    Scenario("users_cursor_deep", users_cursor_deep),
+    Scenario("posts_page", posts_page),
+    Scenario("posts_stream_tail", posts_stream_tail),
+    Scenario("serialize_heavy_user", serialize_heavy_user),
+    Scenario("search_common", search_common),
+    Scenario("search_selective", search_selective),
+    Scenario("search_paged", search_paged),
+    Scenario("my_posts", my_posts, authenticated=True),
+    Scenario("create_post", create_post, expect=(201,), authenticated=True),
+    Scenario("delete_post", delete_post, expect=(204, 404), authenticated=True),
+    Scenario("bulk_create_posts", bulk_create_posts, authenticated=True),
+    Scenario("logout_all", logout_all, authenticated=True),
+    Scenario("user_stats", user_stats),
+    Scenario("cache_stats", cache_stats),
+    Scenario("metrics", metrics),
+]
@@ -0,0 +1,169 @@
+"""Seed a SQLite database for the benchmarks.
+
+    python -m benchmarks.seed --db benchmarks/bench.db --users 1000000 --posts 10000000
+
+Every user has the password SEED_PASSWORD. Posts are spread evenly over
+the users; user 1 additionally owns `heavy_posts` posts, for the large
+page scenarios. Posts are made of a small vocabulary (WORDS) plus one
+of TAGS tags each, giving search both broad and selective terms. The schema comes from the Alembic migrations, so it
+matches what production runs.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from benchmarks import ROOT
+
+SEED_PASSWORD = "benchmark-password"
+# bump when the generated data changes, so old databases get reseeded
+SEED_VERSION = 3
+# post titles carry one of TAGS tags, a selective search term
+EMAIL_DOMAIN = "bench.example.com"
+TAGS = 10000
+
+WORDS = (
+    "async database query index cursor page token cache latency python "
+    "sqlite postgres bcrypt stream json user post refresh session worker "
+    "replica batch metrics bench search count version etag"
+).split()
+
+
+def email(user_id: int) -> str:
+    return f"user{user_id}@{EMAIL_DOMAIN}"
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _migrate(url: str):
+    from alembic import command
+    from alembic.config import Config
+
+    # alembic/env.py takes its URL from database.DATABASE_URL
+    os.environ["DATABASE_URL"] = url
+    database = sys.modules.get("database")
+    if database is not None and database.DATABASE_URL != url:
+        raise RuntimeError("database was imported with another DATABASE_URL, seed before importing the app")
+
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    command.upgrade(config, "head")
+
+def seed(path: str, users: int, posts: int, heavy_posts: int = 10000, chunk_size: int = 10000, force: bool = False) -> dict:
+    """Create and fill the database at `path`, unless it already holds these volumes"""
+    volumes = {"users": users, "posts": posts, "heavy_posts": heavy_posts, "version": SEED_VERSION}
+    meta_path = Path(f"{path}.json")
+
+    if not force and Path(path).exists() and meta_path.exists():
+        if json.loads(meta_path.read_text()) == volumes:
+            return volumes
+
+    for stale in (path, f"{path}-wal", f"{path}-shm", str(meta_path)):
+        Path(stale).unlink(missing_ok=True)
+
+    url = f"sqlite:///{path}"
+    _migrate(url)
+
+    from sqlalchemy import create_engine, insert, text
+    from models import Post, User
+    import security
+
+    rng = random.Random(42)
+    # one hash for everyone: seeding shouldn't take hours of bcrypt
+    password = security.hash_password(SEED_PASSWORD)
+
+    engine = create_engine(url)
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        # a throwaway database, durability doesn't matter while seeding
+        conn.execute(text("PRAGMA synchronous=OFF"))
+        conn.execute(text("PRAGMA journal_mode=WAL"))
+
+        user_rows = (
+            {"id": i, "name": f"user {i}", "email": email(i), "password": password}
+            for i in range(1, users + 1)
+        )
+        for chunk in _chunks(user_rows, chunk_size):
+            conn.execute(insert(User.__table__), chunk)
+
+        post_rows = (
+            {
+                "title": f"{_sentence(rng, 4)} tag{rng.randrange(TAGS)}",
+                "content": _sentence(rng, 20),
+                "user_id": 1 if i < heavy_posts else (i % users) + 1,
+            }
+            for i in range(posts + heavy_posts)
+        )
+        for chunk in _chunks(post_rows, chunk_size):
+            conn.execute(insert(Post.__table__), chunk)
+
+        # the inserts above bypass crud, which maintains the counters
+        conn.execute(text(
+            "UPDATE users SET post_count = (SELECT count(*) FROM posts WHERE posts.user_id = users.id)"
+        ))
+
+        conn.execute(text("ANALYZE"))
+
+    engine.dispose()
+    meta_path.write_text(json.dumps(volumes))
+
+    print(
+        f"seeded {users} users and {posts + heavy_posts} posts in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr
+    )
+    return volumes
+
+
+def copy_database(path: str, copy: str):
+    """Consistent copy of the SQLite database at `path`, replacing `copy`"""
+    import sqlite3
+
+    for stale in (copy, f"{copy}-wal", f"{copy}-shm"):
+        Path(stale).unlink(missing_ok=True)
+
+    source, target = sqlite3.connect(path), sqlite3.connect(copy)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+def make_replicas(path: str, count: int) -> list[str]:
+    """`count` fresh copies of the database at `path`, standing in for read
+    replicas; they don't follow later writes, like a replica lagging forever"""
+    copies = [f"{path}.replica{index}" for index in range(1, count + 1)]
+    for copy in copies:
+        copy_database(path, copy)
+    return copies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a SQLite database for the benchmarks")
+    parser.add_argument("--db", default=str(ROOT / "benchmarks" / "bench.db"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--heavy-posts", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--force", action="store_true", help="reseed even if the volumes match")
+    args = parser.parse_args(argv)
+
+    seed(os.path.abspath(args.db), args.users, args.posts, args.heavy_posts, args.chunk_size, args.force)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Measure how fast a cold worker gets going.
+
+    python -m benchmarks.startup [--runs 5] [--users N --posts N] [--output startup.json]
+
+Two parts, each repeated --runs times (medians are reported):
+
+- `python -X importtime -c "import main"`: total import time, the share
+  of `main` itself, the heaviest top-level packages and the modules with
+  the most self time.
+- `uvicorn main:app` (one worker) against a seeded database: time from
+  spawning the process to its first response, the latency of that first
+  request and of the next one, and the worker's RSS after answering.
+  Measured with STARTUP_WARMUP on and off, to show what the warm-up moves
+  out of the first request.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from benchmarks import ROOT
+from benchmarks.run import _free_port
+from benchmarks.seed import seed
+
+# a read that goes through the ORM, the response cache and pydantic
+FIRST_REQUEST_PATH = "/users/1?posts_limit=20"
+
+
+# ------------------------------
+# Import time
+# ------------------------------
+def parse_importtime(stderr: str) -> list[tuple[float, float, int, str]]:
+    """(self ms, cumulative ms, depth, module) per line of -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(self_us) / 1000, int(cumulative_us) / 1000, depth, name.strip()))
+    return entries
+
+def import_times(module: str, env: dict) -> dict:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+    entries = parse_importtime(completed.stderr)
+
+    # depth 0 entries are what the interpreter (site) and `import module` pulled in
+    top_level = [entry for entry in entries if entry[2] == 0]
+    packages: dict[str, float] = {}
+    for _, cumulative, depth, name in entries:
+        if depth == 1 and name.split(".")[0] != module:
+            root = name.split(".")[0]
+            packages[root] = packages.get(root, 0.0) + cumulative
+
+    return {
+        "wall_ms": round(wall * 1000, 1),
+        "total_ms": round(sum(entry[1] for entry in top_level), 1),
+        "module_ms": round(sum(entry[1] for entry in top_level if entry[3] == module), 1),
+        "modules": len(entries),
+        "packages_ms": {
+            name: round(ms, 1)
+            for name, ms in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:15]
+        },
+        "slowest_self_ms": {
+            name: round(ms, 1)
+            for ms, _, _, name in sorted(entries, reverse=True)[:15]
+        },
+    }
+
+
+# ------------------------------
+# Time to first response
+# ------------------------------
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def first_response(env: dict, timeout: float = 60) -> dict:
+    import httpx
+
+    port = _free_port()
+    started = time.perf_counter()
+    # no --workers: the server runs in this pid, so its RSS is the worker's
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        cwd=ROOT,
+        env=env
+    )
+
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while True:
+                sent = time.perf_counter()
+                try:
+                    response = client.get(FIRST_REQUEST_PATH)
+                    break
+                except httpx.TransportError:
+                    if time.perf_counter() - started > timeout or server.poll() is not None:
+                        raise RuntimeError("uvicorn did not come up")
+                    time.sleep(0.005)
+            answered = time.perf_counter()
+            response.raise_for_status()
+
+            again = time.perf_counter()
+            client.get(FIRST_REQUEST_PATH, params={"posts_limit": 19}).raise_for_status()
+            second = time.perf_counter() - again
+
+            return {
+                "time_to_first_response_ms": round((answered - started) * 1000, 1),
+                "first_request_ms": round((answered - sent) * 1000, 2),
+                "second_request_ms": round(second * 1000, 2),
+                "rss_mb": _rss_mb(server.pid),
+            }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _medians(runs: list[dict]) -> dict:
+    return {
+        key: round(statistics.median(run[key] for run in runs), 2)
+        for key, value in runs[0].items()
+        if isinstance(value, (int, float))
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time to first response")
+    parser.add_argument("--db", default=str(ROOT / "benchmarks" / "bench.db"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--heavy-posts", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    path = os.path.abspath(args.db)
+    volumes = seed(path, args.users, args.posts, args.heavy_posts)
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{path}",
+        "REAPER_INTERVAL_SECONDS": "0",
+    }
+
+    imports = [import_times(args.module, env) for _ in range(args.runs)]
+    # the run with the median total, so the breakdown adds up
+    imports.sort(key=lambda run: run["total_ms"])
+
+    startup = {}
+    for warmup in ("true", "false"):
+        runs = [first_response({**env, "STARTUP_WARMUP": warmup}) for _ in range(args.runs)]
+        startup[f"warmup_{warmup}"] = {"median": _medians(runs), "runs": runs}
+
+    results = {
+        "meta": {
+            "runs": args.runs,
+            "volumes": volumes,
+            "path": FIRST_REQUEST_PATH,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "import_time": imports[len(imports) // 2],
+        "import_total_ms": [run["total_ms"] for run in imports],
+        "startup": startup,
+    }
+
+    body = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + "\n")
+    else:
+        print(body)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+from typing import AsyncIterable, Awaitable, Callable
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import schemas
+
+
+DEFAULT_CHUNK_SIZE = 1000
+# rows parsed and hashed before the first insert; bounds the memory of one import
+MAX_CHUNK_SIZE = 10000
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+async def _import(
+    session: AsyncSession,
+    lines: AsyncIterable[bytes],
+    parse: Callable[[bytes], BaseModel],
+    insert_chunk: Callable[[AsyncSession, list], Awaitable[dict[int, str]]],
+    chunk_size: int
+) -> schemas.BulkImportResult:
+    """Parse NDJSON lines and insert them chunk by chunk.
+
+    Rows that fail validation or insertion are reported by line number,
+    the rest of the batch carries on.
+    """
+    result = schemas.BulkImportResult()
+    chunk, chunk_lines = [], []
+
+    async def flush():
+        errors = await insert_chunk(session, chunk)
+        result.inserted += len(chunk) - len(errors)
+        result.errors.extend(
+            schemas.BulkRowError(line=chunk_lines[index], error=error)
+            for index, error in errors.items()
+        )
+        chunk.clear()
+        chunk_lines.clear()
+
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+
+        try:
+            chunk.append(parse(line))
+        except ValidationError as exc:
+            result.errors.append(schemas.BulkRowError(line=line_no, error=_describe(exc)))
+            continue
+        chunk_lines.append(line_no)
+
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    if chunk:
+        await flush()
+
+    result.errors.sort(key=lambda error: error.line)
+    return result
+
+async def import_users(
+    session: AsyncSession,
+    lines: AsyncIterable[bytes],
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> schemas.BulkImportResult:
+    """Import UserCreate rows from NDJSON"""
+    return await _import(
+        session, lines,
+        schemas.UserCreate.model_validate_json,
+        crud.bulk_create_users,
+        chunk_size
+    )
+
+async def import_posts(
+    session: AsyncSession,
+    lines: AsyncIterable[bytes],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    user_id: int | None = None
+) -> schemas.BulkImportResult:
+    """Import posts from NDJSON.
+
+    With `user_id` every row is a PostCreate owned by that user,
+    otherwise rows are PostImport and carry their own user_id.
+    """
+    if user_id is None:
+        parse = schemas.PostImport.model_validate_json
+    else:
+        def parse(line: bytes) -> schemas.PostImport:
+            post = schemas.PostCreate.model_validate_json(line)
+            return schemas.PostImport(**post.model_dump(), user_id=user_id)
+
+    return await _import(session, lines, parse, crud.bulk_create_posts, chunk_size)
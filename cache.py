@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+# ------------------------------
+# In-process TTL + LRU cache
+# ------------------------------
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ------------------------------
+# Shared backends
+# ------------------------------
+class CacheBackend:
+    """Interface for a cache shared between workers (Redis and the like).
+
+    Values are bytes; expiry is handled by the backend.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        """get() of each key, in order; backends with a multi-get override it"""
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str, ttl: float) -> int:
+        """Atomically add one to the counter at `key` (missing counts as 0)
+        and return it; the counter expires `ttl` seconds after this call"""
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """In-memory stand-in for a shared backend, for tests and single-process runs"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        # no await between the read and the write, so atomic within the loop
+        current = int(await self.get(key) or 0) + 1
+        self._data[key] = (time.monotonic() + ttl, str(current).encode())
+        return current
+
+
+class LRUBackend(CacheBackend):
+    """Process-local backend bounded by an LRU, for when nothing is shared"""
+
+    def __init__(self, maxsize: int = 1024):
+        self._data = TTLCache(maxsize)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._data.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._data.set(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.delete(key)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        current = int(self._data.get(key) or 0) + 1
+        self._data.set(key, str(current).encode(), ttl)
+        return current
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend(CacheBackend):
+    """Backend on a Redis-protocol server; needs the `redis` package.
+
+    Pass `client` to use an existing asyncio client instead of a URL, e.g.
+    fakeredis.aioredis.FakeRedis() in tests.
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("install 'redis' to use a Redis cache backend")
+            client = redis.from_url(url)
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        # one round trip however many keys
+        return list(await self.client.mget(keys)) if keys else []
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def incr(self, key: str, ttl: float) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.pexpire(key, max(1, int(ttl * 1000)))
+            current, _ = await pipe.execute()
+        return int(current)
+
+
+def make_backend(url: Optional[str] = None, maxsize: int = 1024) -> CacheBackend:
+    """Redis backend for a redis:// (or rediss://, unix://) URL, else a local LRU"""
+    if url:
+        return RedisBackend(url)
+    return LRUBackend(maxsize)
+
+
+# ------------------------------
+# Read-through response cache
+# ------------------------------
+# handed to the callers waiting on a load whose leader was cancelled
+_RELOAD = object()
+
+
+class ResponseCache:
+    """Rendered responses, as (headers, body), invalidated by scope.
+
+    Each entry is filed under the current generation of the scopes it
+    depends on (e.g. "user:1", or one per id of a batch); invalidating a
+    scope starts a new generation, so every entry under it is missed
+    from then on and left to expire. Generations live in the backend
+    too, so with a shared backend an invalidation is seen by every
+    worker.
+
+    Take the key with `versioned_key` *before* reading the database: a
+    write that lands in between then files the stale render under a
+    generation that is already gone.
+
+    Concurrent misses on one key are coalesced within a process: the
+    first caller runs the loader, the others wait for its result. If the
+    first caller is cancelled (its client went away), the others run
+    their own loaders instead, coalesced again.
+    """
+
+    def __init__(self, namespace: str, backend: CacheBackend, ttl: float = 30):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self._pending: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def _generations(self, scopes: list[str]) -> list[str]:
+        keys = [f"{self.namespace}:gen:{scope}" for scope in scopes]
+        generations = await self.backend.get_many(keys)
+
+        for index, generation in enumerate(generations):
+            if generation is None:
+                # unknown or evicted: a fresh generation can only cause misses
+                generations[index] = uuid.uuid4().hex.encode("ascii")
+                await self.backend.set(keys[index], generations[index], self.ttl * 10)
+
+        return [generation.decode("ascii") for generation in generations]
+
+    async def versioned_key(self, key: str, scopes: list[str]) -> str:
+        generations = await self._generations(scopes)
+        if len(generations) > 1:
+            # a batch may depend on a thousand scopes; keep the key short
+            generations = [hashlib.blake2b(":".join(generations).encode("ascii"), digest_size=16).hexdigest()]
+        return ":".join([self.namespace, key, *generations])
+
+    async def invalidate(self, *scopes: str):
+        if not self.enabled:
+            return
+        for scope in scopes:
+            generation = uuid.uuid4().hex.encode("ascii")
+            await self.backend.set(f"{self.namespace}:gen:{scope}", generation, self.ttl * 10)
+
+    async def get(self, key: str) -> Optional[tuple[dict, bytes]]:
+        raw = await self.backend.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        headers, body = raw.split(b"\n", 1)
+        return json.loads(headers), body
+
+    async def load(self, key: str, loader) -> Optional[tuple[dict, bytes]]:
+        """Run `loader` once for all concurrent callers and store what it returns.
+
+        A None result (e.g. not found) is handed to every waiter but not cached.
+        """
+        pending = self._pending.get(key)
+        while pending is not None:
+            self.coalesced += 1
+            entry = await asyncio.shield(pending)
+            if entry is not _RELOAD:
+                return entry
+            pending = self._pending.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            entry = await loader()
+            if entry is not None:
+                headers, body = entry
+                await self.backend.set(key, json.dumps(headers).encode("utf-8") + b"\n" + body, self.ttl)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            # this caller's cancellation, not the waiters': they load for themselves
+            future.set_result(_RELOAD)
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # mark it retrieved, there may be nobody waiting
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
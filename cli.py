@@ -0,0 +1,71 @@
+"""Maintenance commands.
+
+    python cli.py import-users users.ndjson [--chunk-size N]
+    python cli.py import-posts posts.ndjson [--chunk-size N]
+    python cli.py reap-tokens [--batch-size N]
+    python cli.py reconcile-post-counts [--batch-size N]
+"""
+import argparse
+import asyncio
+import sys
+
+import bulk
+import crud
+import reaper
+from database import AsyncSessionLocal
+
+
+async def _file_lines(path: str):
+    with open(path, "rb") as file:
+        for line in file:
+            yield line
+
+async def import_users(args):
+    async with AsyncSessionLocal() as session:
+        return await bulk.import_users(session, _file_lines(args.file), args.chunk_size)
+
+async def import_posts(args):
+    # rows are PostImport objects carrying their own user_id
+    async with AsyncSessionLocal() as session:
+        return await bulk.import_posts(session, _file_lines(args.file), args.chunk_size)
+
+async def reap_tokens(args):
+    reaped = await reaper.reap_expired_tokens(args.batch_size)
+    print(f"reaped {reaped} expired refresh tokens")
+
+async def reconcile_post_counts(args):
+    async with AsyncSessionLocal() as session:
+        fixed = await crud.reconcile_post_counts(session, args.batch_size)
+    print(f"corrected the post count of {fixed} users")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="User-Post API maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, handler in (("import-users", import_users), ("import-posts", import_posts)):
+        command = commands.add_parser(name, help=f"{name.replace('-', ' ')} from an NDJSON file")
+        command.add_argument("file")
+        command.add_argument("--chunk-size", type=int, default=bulk.DEFAULT_CHUNK_SIZE)
+        command.set_defaults(handler=handler)
+
+    command = commands.add_parser("reap-tokens", help="delete expired refresh tokens")
+    command.add_argument("--batch-size", type=int, default=reaper.REAPER_BATCH_SIZE)
+    command.set_defaults(handler=reap_tokens)
+
+    command = commands.add_parser("reconcile-post-counts", help="recompute users.post_count from posts")
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.set_defaults(handler=reconcile_post_counts)
+
+    args = parser.parse_args(argv)
+    result = asyncio.run(args.handler(args))
+    if result is None:
+        return 0
+
+    print(result.model_dump_json(indent=2))
+
+    return 1 if result.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
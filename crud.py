@@ -1,140 +1,853 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+import asyncio
+from collections import Counter, defaultdict
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import delete, func, insert, or_, select, text, update
 from models import User, Post, RefreshToken
-from schemas import UserCreate, UserUpdate, PostCreate
-from security import hash_password
+from schemas import UserCreate, UserUpdate, PostCreate, PostImport
+from security import hash_password_async, hash_passwords_bulk
 from datetime import datetime, timedelta, timezone
+import cache
+import html
+import os
 import security
+import uuid
 
 
-def create_user(session: Session, user_data: UserCreate):
+# ------------------------------
+# Response cache
+# ------------------------------
+# entry lifetime in seconds, 0 disables the cache
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# e.g. redis://localhost:6379/0 to share entries (and invalidations) between
+# workers; the default in-process LRU only sees this process's writes, so
+# serve.py turns the cache off when it runs several workers without one
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+response_cache = cache.ResponseCache(
+    "responses",
+    cache.make_backend(RESPONSE_CACHE_URL, RESPONSE_CACHE_SIZE),
+    ttl=RESPONSE_CACHE_TTL
+)
+
+# GET /users/ pages embed users and their posts, and which users a page
+# holds is only known once it is read, so any change to either bumps it
+USERS_SCOPE = "users"
+# GET /stats/users: user and post totals, and the top authors' names
+STATS_SCOPE = "stats"
+
+def user_scope(user_id: int) -> str:
+    """Scope of the responses built from one user and their posts, /users/batch entries included"""
+    return f"user:{user_id}"
+
+def post_scope(post_id: int) -> str:
+    """Scope of the /posts/batch entries that ask for one post"""
+    return f"post:{post_id}"
+
+
+async def create_user(session: AsyncSession, user_data: UserCreate):
+    password = await hash_password_async(user_data.password)
+
     user = User(name=user_data.name,
                 email=user_data.email,
-                password = hash_password(user_data.password))
-                
-    
+                password = password,
+                posts=[])
+
+
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    # a batch may have asked for this id and found it missing
+    await response_cache.invalidate(user_scope(user.id), USERS_SCOPE, STATS_SCOPE)
     return user
 
-def get_users(session: Session, skip: int, limit: int):
+# columns of the list endpoints' fast path: rows come back as plain dicts
+# and are dumped straight to JSON, without building ORM objects
+POST_COLUMNS = (Post.id, Post.title, Post.content, Post.user_id)
+USER_COLUMNS = (User.id, User.name, User.email, User.post_count)
+
+def _as_dicts(result) -> list[dict]:
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+async def _posts_by_user(
+        session: AsyncSession,
+        user_ids: list[int],
+        posts_limit: int | None
+) -> dict[int, list[dict]]:
+    """Post rows of several users in one query, at most `posts_limit` (lowest ids first) each"""
+    by_user = defaultdict(list)
+
+    if not user_ids or posts_limit == 0:
+        return by_user
+
+    if posts_limit is None:
+        stmt = (
+            select(*POST_COLUMNS)
+            .where(Post.user_id.in_(user_ids))
+            .order_by(Post.user_id, Post.id)
+        )
+    else:
+        ranked = (
+            select(
+                *POST_COLUMNS,
+                func.row_number()
+                .over(partition_by=Post.user_id, order_by=Post.id)
+                .label("rn")
+            )
+            .where(Post.user_id.in_(user_ids))
+            .subquery()
+        )
+        stmt = (
+            select(ranked.c.id, ranked.c.title, ranked.c.content, ranked.c.user_id)
+            .where(ranked.c.rn <= posts_limit)
+            .order_by(ranked.c.user_id, ranked.c.id)
+        )
+
+    for post in _as_dicts(await session.execute(stmt)):
+        by_user[post["user_id"]].append(post)
+
+    return by_user
+
+async def get_users(
+        session: AsyncSession,
+        skip: int,
+        limit: int,
+        after_id: int | None = None,
+        posts_limit: int | None = None
+) -> list[dict]:
+    """A page of users as dicts, each with its posts; two queries whatever the page size"""
 
     stmt = (
-        select(User)
-        .offset(skip)
+        select(*USER_COLUMNS)
+        .order_by(User.id)
         .limit(limit)
     )
 
-    return session.scalars(stmt).all()
+    # keyset mode: seek past the last seen id instead of walking skipped rows
+    if after_id is not None:
+        stmt = stmt.where(User.id > after_id)
+    else:
+        stmt = stmt.offset(skip)
 
+    users = _as_dicts(await session.execute(stmt))
 
-def get_user_by_id(
-        session: Session,
-        user_id: int
+    posts = await _posts_by_user(session, [user["id"] for user in users], posts_limit)
+    for user in users:
+        user["posts"] = posts[user["id"]]
+
+    return users
+
+
+async def get_user_by_id(
+        session: AsyncSession,
+        user_id: int,
+        load_posts: bool = False,
+        posts_limit: int | None = None
 ):
-    return session.get(User, user_id)
+    if not load_posts:
+        return await session.get(User, user_id)
+
+    if posts_limit is None:
+        return await session.get(User, user_id, options=[selectinload(User.posts)])
+
+    user = await session.get(User, user_id, options=[noload(User.posts)])
+
+    if user:
+        stmt = (
+            select(Post)
+            .where(Post.user_id == user_id)
+            .order_by(Post.id)
+            .limit(posts_limit)
+        )
+        set_committed_value(user, "posts", (await session.scalars(stmt)).all())
+
+    return user
 
-def get_user_by_email(session: Session, email: str):
+async def _watermark(session: AsyncSession, stmt) -> tuple:
+    """(count, max id, sum of ids, sum of versions) over the post rows `stmt` selects.
+
+    Any insert, delete or ORM update within those rows changes it, so it
+    stands in for the rows themselves when building an ETag. That takes
+    post ids that are never reused (AUTOINCREMENT on SQLite): a new post
+    taking a deleted post's id would leave every term as it was.
+    """
+    page = stmt.with_only_columns(Post.id, Post.version).subquery()
+    watermark = select(
+        func.count(),
+        func.max(page.c.id),
+        func.coalesce(func.sum(page.c.id), 0),
+        func.coalesce(func.sum(page.c.version), 0)
+    )
+    return tuple((await session.execute(watermark)).one())
+
+async def get_user_watermark(session: AsyncSession, user_id: int, posts_limit: int | None = None):
+    """What GET /users/{id} depends on: the user's version and post_count, and its posts; None if no such user"""
+    # post_count is kept by Core UPDATEs (_count_posts), which don't bump version
+    user = (await session.execute(
+        select(User.version, User.post_count).where(User.id == user_id)
+    )).first()
+    if user is None:
+        return None
+
+    stmt = select(Post.id).where(Post.user_id == user_id).order_by(Post.id)
+    if posts_limit is not None:
+        stmt = stmt.limit(posts_limit)
+
+    return (*user, *await _watermark(session, stmt))
+
+async def get_user_by_email(session: AsyncSession, email: str):
     stmt = select(User).where(User.email == email)
-    return session.scalars(stmt).first()
+    return (await session.scalars(stmt)).first()
 
-def update_user(session: Session, user_id: int, user_data: UserUpdate):
+async def update_user(session: AsyncSession, user_id: int, user_data: UserUpdate):
+
+    # the response embeds the user's posts, load them up front
+    user = await get_user_by_id(session, user_id, load_posts=True)
+
+    if not user:
+        return
 
-    user= session.get(User, user_id)
+    if user_data.name:
 
-    if not user: 
-        return 
-    
-    if user_data.name: 
-        
         user.name= user_data.name
-    
+
     if user_data.email:
 
         user.email = user_data.email
 
     if user_data.password:
-        user.password = hash_password(user_data.password)
+        user.password = await hash_password_async(user_data.password)
+
+    await session.commit()
+    await response_cache.invalidate(user_scope(user.id), USERS_SCOPE, STATS_SCOPE)
 
-    session.commit()
-    session.refresh(user)
-    
     return user
 
-def delete_user (session: Session, user_id: int):
+async def delete_user (session: AsyncSession, user_id: int):
 
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
 
     if not user:
         return
-    
-    session.delete(user)
-    
-    session.commit()
+
+    post_ids = list(await session.scalars(select(Post.id).where(Post.user_id == user_id)))
+
+    # posts go with the user (ORM cascade), and with them the only counter they fed
+    await session.delete(user)
+
+    await session.commit()
+    await response_cache.invalidate(
+        user_scope(user.id), *map(post_scope, post_ids), USERS_SCOPE, STATS_SCOPE
+    )
 
     return True
 
-def create_post_in_db (session: Session, post_data: PostCreate, user_id: int):
+def _count_posts(session, user_id: int, delta: int):
+    """Adjust a user's post_count in the caller's transaction; atomic in SQL"""
+    return session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(post_count=User.post_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+async def create_post_in_db (session: AsyncSession, post_data: PostCreate, user_id: int):
+    """Create a post of `user_id`; None if there is no such user (e.g. a token outliving its user)"""
     post = Post(title=post_data.title, content=post_data.content, user_id=user_id)
     session.add(post)
-    session.commit()
-    session.refresh(post)
+    await _count_posts(session, user_id, 1)
+    try:
+        await session.commit()
+    except IntegrityError:
+        # the posts.user_id foreign key
+        await session.rollback()
+        return None
+    await response_cache.invalidate(user_scope(user_id), post_scope(post.id), USERS_SCOPE, STATS_SCOPE)
     return post
 
-def get_posts(session:Session) -> list[Post]:
-    stmt = select(Post)
-    return session.scalars(stmt).all()
+async def delete_post(session: AsyncSession, post_id: int, user_id: int) -> bool | None:
+    """Delete a post of `user_id`: None if there is no such post, False if it isn't theirs"""
+    post = await session.get(Post, post_id)
 
-def get_posts_by_user(
-    session: Session,
-    user_id: int,
-    skip: int = 0,
-    limit: int = 10
-) -> list[Post]:
+    if not post:
+        return None
+
+    if post.user_id != user_id:
+        return False
+
+    await session.delete(post)
+    await _count_posts(session, user_id, -1)
+    await session.commit()
+    await response_cache.invalidate(user_scope(user_id), post_scope(post_id), USERS_SCOPE, STATS_SCOPE)
+
+    return True
+
+def _posts_stmt(limit: int | None = None, after_id: int | None = None):
+    stmt = select(*POST_COLUMNS).order_by(Post.id).limit(limit)
+
+    if after_id is not None:
+        stmt = stmt.where(Post.id > after_id)
+
+    return stmt
 
+async def get_posts(session: AsyncSession, limit: int, after_id: int | None = None) -> list[dict]:
+    return _as_dicts(await session.execute(_posts_stmt(limit, after_id)))
+
+async def get_posts_watermark(session: AsyncSession, limit: int, after_id: int | None = None):
+    """Watermark of the rows get_posts would return; a page only, stream_posts has none"""
+    return await _watermark(session, _posts_stmt(limit, after_id))
+
+async def stream_posts(session: AsyncSession, after_id: int | None = None, batch_size: int = 500):
+    """Yield post rows as dicts in id order, fetching `batch_size` rows at a time.
+
+    Only the columns needed for PostResponse are selected and the result
+    is consumed as a server-side cursor, so memory stays flat however many
+    posts exist.
+    """
+    stmt = _posts_stmt(after_id=after_id).execution_options(yield_per=batch_size)
+
+    result = await session.stream(stmt)
+    keys = list(result.keys())
+    async for row in result:
+        yield dict(zip(keys, row))
+
+def _posts_by_user_stmt(user_id: int, skip: int, limit: int, after_id: int | None):
     stmt = (
-        select(Post)
+        select(*POST_COLUMNS)
         .where(Post.user_id == user_id)
-        .offset(skip)
+        .order_by(Post.user_id, Post.id)
         .limit(limit)
     )
 
-    return session.scalars(stmt).all()
-
+    if after_id is not None:
+        stmt = stmt.where(Post.id > after_id)
+    else:
+        stmt = stmt.offset(skip)
 
+    return stmt
 
+async def get_posts_by_user(
+    session: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 10,
+    after_id: int | None = None
+) -> list[dict]:
+    stmt = _posts_by_user_stmt(user_id, skip, limit, after_id)
+    return _as_dicts(await session.execute(stmt))
+
+async def get_posts_by_user_watermark(
+    session: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 10,
+    after_id: int | None = None
+):
+    """Watermark of the rows get_posts_by_user would return"""
+    return await _watermark(session, _posts_by_user_stmt(user_id, skip, limit, after_id))
+
+async def warm_up(session: AsyncSession):
+    """Run the hot read paths once, so their SQL is compiled and cached
+    before the first request needs it; id 0 matches nothing"""
+    await get_user_watermark(session, 0, 1)
+    await get_user_by_id(session, 0, load_posts=True, posts_limit=1)
+    await get_user_by_email(session, "")
+    await get_users(session, 0, 1, after_id=0, posts_limit=1)
+    await get_posts(session, 1, after_id=0)
+    await get_posts_watermark(session, 1, after_id=0)
+    await get_posts_by_user(session, 0, after_id=0)
+    await get_posts_by_user_watermark(session, 0, after_id=0)
+
+
+# ------------------------------
+# Lookups by many ids
+# ------------------------------
+# ids per IN (...) query; far below any database's bound parameter limit
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+# ids accepted by one GET /users/batch or /posts/batch
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "1000"))
+
+async def get_users_by_ids(session: AsyncSession, ids: list[int], posts_limit: int | None = None) -> dict[int, dict]:
+    """User rows (as in get_users) by id; two queries however many ids"""
+    stmt = select(*USER_COLUMNS).where(User.id.in_(ids))
+    users = {user["id"]: user for user in _as_dicts(await session.execute(stmt))}
+
+    posts = await _posts_by_user(session, list(users), posts_limit)
+    for user_id, user in users.items():
+        user["posts"] = posts[user_id]
+
+    return users
+
+async def get_posts_by_ids(session: AsyncSession, ids: list[int]) -> dict[int, dict]:
+    stmt = select(*POST_COLUMNS).where(Post.id.in_(ids))
+    return {post["id"]: post for post in _as_dicts(await session.execute(stmt))}
+
+
+class BatchLoader:
+    """Collapse concurrent lookups by id into chunked batch queries.
+
+    `batch(ids)` returns {id: row} for the ids that exist. Every load()
+    made in the same event loop iteration joins one batch; a key is only
+    fetched once per loader, so use one loader per request (and session).
+
+        users = BatchLoader(lambda ids: get_users_by_ids(session, ids))
+        alice, bob = await asyncio.gather(users.load(1), users.load(2))
+    """
+
+    def __init__(self, batch, chunk_size: int = BATCH_CHUNK_SIZE):
+        self.batch = batch
+        self.chunk_size = chunk_size
+        self._results: dict = {}
+        self._pending: list = []
+        # the event loop only keeps weak references to tasks
+        self._tasks: set = set()
+        # a session runs one statement at a time
+        self._lock = asyncio.Lock()
+
+    def load(self, key) -> asyncio.Future:
+        """Future of the row for `key`, None if it doesn't exist"""
+        future = self._results.get(key)
+        if future is None:
+            future = self._results[key] = asyncio.get_running_loop().create_future()
+            if not self._pending:
+                asyncio.get_running_loop().call_soon(self._dispatch)
+            self._pending.append(key)
+        return future
+
+    async def load_many(self, keys) -> list:
+        """Rows for `keys` in their order, None where missing"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self):
+        keys, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._fetch(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, keys: list):
+        async with self._lock:
+            for start in range(0, len(keys), self.chunk_size):
+                chunk = keys[start:start + self.chunk_size]
+                futures = [self._results[key] for key in chunk]
+                try:
+                    found = await self.batch(chunk)
+                except Exception as exc:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                # skip the futures whose caller went away
+                for key, future in zip(chunk, futures):
+                    if not future.done():
+                        future.set_result(found.get(key))
+
+
+# ------------------------------
+# Post counters
+# ------------------------------
+# lower bounds of the post_count histogram buckets; the last one is open-ended
+POST_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+async def get_user_stats(session: AsyncSession, top: int = 10) -> dict:
+    """Top authors and a post_count histogram, all from users.post_count.
+
+    Every figure is a walk of ix_users_post_count (top-N from its high
+    end, one range count per bucket); posts is never scanned.
+    """
+    bounds = list(zip(POST_COUNT_BUCKETS, (*POST_COUNT_BUCKETS[1:], None)))
+
+    def users_between(low: int, high: int | None):
+        stmt = select(func.count()).select_from(User).where(User.post_count >= low)
+        if high is not None:
+            stmt = stmt.where(User.post_count < high)
+        return stmt.scalar_subquery()
+
+    totals = (await session.execute(select(
+        func.count(User.id),
+        func.coalesce(func.sum(User.post_count), 0),
+        *(users_between(low, high) for low, high in bounds)
+    ))).one()
+
+    top_authors = _as_dicts(await session.execute(
+        select(User.id, User.name, User.post_count)
+        .order_by(User.post_count.desc(), User.id.desc())
+        .limit(top)
+    ))
+
+    return {
+        "users": totals[0],
+        "posts": totals[1],
+        "top_authors": top_authors,
+        "post_count_histogram": [
+            {"min": low, "max": high, "users": users}
+            for (low, high), users in zip(bounds, totals[2:])
+        ],
+    }
+
+async def reconcile_post_counts(session: AsyncSession, batch_size: int = 1000) -> int:
+    """Recompute users.post_count from posts, `batch_size` users per transaction.
+
+    Repairs drift from writes that bypassed crud (e.g. manual SQL).
+    Returns the number of users whose counter was wrong.
+    """
+    fixed = 0
+    last_id = 0
+
+    while True:
+        ids = list(await session.scalars(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ))
+        if not ids:
+            break
+
+        actual = (
+            select(func.count())
+            .where(Post.user_id == User.id)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        result = await session.execute(
+            update(User)
+            .where(User.id.between(ids[0], ids[-1]), User.post_count != actual)
+            # the representation changes, so must the version behind its ETag
+            .values(post_count=actual, version=User.version + 1)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        corrected = list(result.scalars())
+        await session.commit()
+
+        if corrected:
+            fixed += len(corrected)
+            await response_cache.invalidate(*(user_scope(user_id) for user_id in corrected))
+
+        last_id = ids[-1]
+
+    if fixed:
+        await response_cache.invalidate(USERS_SCOPE, STATS_SCOPE)
+
+    return fixed
+
+# ------------------------------
+# Full-text search
+# ------------------------------
+# markers the database puts around matches; swapped for <mark> once the
+# snippet is HTML-escaped, so post content can't inject markup
+_MATCH_OPEN, _MATCH_CLOSE = "\x02", "\x03"
+
+# the page is ranked first, then snippets are built for its rows only
+_SEARCH_SQLITE = text("""
+    WITH page AS (
+        SELECT id, rank FROM (
+            SELECT posts_fts.rowid AS id, bm25(posts_fts, 2.0, 1.0) AS rank
+            FROM posts_fts
+            WHERE posts_fts MATCH :query
+        )
+        WHERE :after_rank IS NULL OR rank > :after_rank OR (rank = :after_rank AND id > :after_id)
+        ORDER BY rank, id
+        LIMIT :limit
+    )
+    SELECT posts.id, posts.title, posts.content, posts.user_id, page.rank,
+           snippet(posts_fts, -1, :open, :close, '…', 16) AS snippet
+    FROM page
+    CROSS JOIN posts_fts
+    CROSS JOIN posts
+    WHERE posts_fts MATCH :query AND posts_fts.rowid = page.id AND posts.id = page.id
+    ORDER BY page.rank, page.id
+""")
+
+# ts_rank_cd is higher-is-better, negate it so both dialects sort ascending
+_SEARCH_POSTGRES = text("""
+    WITH query AS (SELECT websearch_to_tsquery('english', :query) AS q),
+    page AS (
+        SELECT id, rank FROM (
+            SELECT posts.id, -ts_rank_cd(posts.search_vector, query.q) AS rank
+            FROM posts, query
+            WHERE posts.search_vector @@ query.q
+        ) AS ranked
+        WHERE CAST(:after_rank AS float8) IS NULL OR rank > :after_rank OR (rank = :after_rank AND id > :after_id)
+        ORDER BY rank, id
+        LIMIT :limit
+    )
+    SELECT posts.id, posts.title, posts.content, posts.user_id, page.rank,
+           ts_headline('english', coalesce(posts.content, posts.title), query.q,
+                       'StartSel=' || :open || ', StopSel=' || :close || ', MaxWords=24, MinWords=8') AS snippet
+    FROM page JOIN posts ON posts.id = page.id, query
+    ORDER BY page.rank, page.id
+""")
+
+def _fts5_query(q: str) -> str:
+    """User input as an FTS5 query: every word must match, `word*` matches a prefix.
+
+    Words are quoted, so FTS5 operators and syntax in the input are
+    searched for literally instead of failing the query.
+    """
+    terms = []
+    for word in q.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def _highlight(snippet: str | None) -> str | None:
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MATCH_OPEN, "<mark>").replace(_MATCH_CLOSE, "</mark>")
+
+async def search_posts(
+    session: AsyncSession,
+    q: str,
+    limit: int = 20,
+    after: tuple[float, int] | None = None
+) -> list[dict]:
+    """Posts matching `q`, best first, as dicts with `rank` and `snippet`.
+
+    Keyset-paginated on (rank, id): pass the last row's pair as `after`.
+    Needs the add_post_search_index migration (FTS5 on SQLite, a
+    tsvector column on Postgres).
+    """
+    if session.bind.dialect.name == "postgresql":
+        stmt, query = _SEARCH_POSTGRES, q
+    else:
+        stmt, query = _SEARCH_SQLITE, _fts5_query(q)
+
+    if not query:
+        return []
+
+    after_rank, after_id = after or (None, None)
+    rows = _as_dicts(await session.execute(stmt, {
+        "query": query,
+        "after_rank": after_rank,
+        "after_id": after_id,
+        "limit": limit,
+        "open": _MATCH_OPEN,
+        "close": _MATCH_CLOSE,
+    }))
+
+    for row in rows:
+        row["snippet"] = _highlight(row["snippet"])
+
+    return rows
+
+
+async def _bulk_insert(
+        session: AsyncSession,
+        model,
+        rows: list[dict],
+        indexes: list[int],
+        on_insert=None
+) -> tuple[dict[int, str], list[int]]:
+    """Insert rows with one multi-row INSERT ... RETURNING.
+
+    If the batch hits a constraint the pre-checks didn't catch (e.g. a
+    concurrent insert), fall back to row-by-row inserts so one bad row
+    doesn't abort the rest. Returns {index: error} for rejected rows and
+    the ids of the inserted ones.
+    `on_insert(session, rows)` runs in the same transaction as each insert.
+    """
+    if not rows:
+        return {}, []
+
+    stmt = insert(model).returning(model.id)
+
+    try:
+        ids = list((await session.execute(stmt, rows)).scalars())
+        if on_insert:
+            await on_insert(session, rows)
+        await session.commit()
+        return {}, ids
+    except IntegrityError:
+        await session.rollback()
+
+    errors, ids = {}, []
+    for index, row in zip(indexes, rows):
+        try:
+            ids.extend((await session.execute(stmt, [row])).scalars())
+            if on_insert:
+                await on_insert(session, [row])
+            await session.commit()
+        except IntegrityError as exc:
+            await session.rollback()
+            errors[index] = str(exc.orig)
+
+    return errors, ids
+
+async def bulk_create_users(session: AsyncSession, users: list[UserCreate]) -> dict[int, str]:
+    """Create a chunk of users; returns {index: error} for the rows that were skipped"""
+    errors = {}
+
+    emails = {user.email for user in users}
+    taken = set(await session.scalars(select(User.email).where(User.email.in_(emails))))
+
+    accepted = []
+    for index, user in enumerate(users):
+        if user.email in taken:
+            errors[index] = "Email already registered"
+            continue
+        taken.add(user.email)
+        accepted.append(index)
+
+    rows, hashed = [], []
+    passwords = await hash_passwords_bulk([users[i].password for i in accepted])
+    for index, password in zip(accepted, passwords):
+        if isinstance(password, ValueError):
+            errors[index] = str(password)
+            continue
+        rows.append({"name": users[index].name, "email": users[index].email, "password": password})
+        hashed.append(index)
+
+    failed, ids = await _bulk_insert(session, User, rows, hashed)
+    errors.update(failed)
+    await response_cache.invalidate(*map(user_scope, ids), USERS_SCOPE, STATS_SCOPE)
+    return errors
+
+async def _count_bulk_posts(session, rows: list[dict]):
+    # one UPDATE per distinct author, not per post
+    for user_id, count in Counter(row["user_id"] for row in rows).items():
+        await _count_posts(session, user_id, count)
+
+async def bulk_create_posts(session: AsyncSession, posts: list[PostImport]) -> dict[int, str]:
+    """Create a chunk of posts; returns {index: error} for the rows that were skipped"""
+    errors = {}
+
+    user_ids = {post.user_id for post in posts}
+    known = set(await session.scalars(select(User.id).where(User.id.in_(user_ids))))
+
+    accepted = []
+    for index, post in enumerate(posts):
+        if post.user_id not in known:
+            errors[index] = "User not found"
+            continue
+        accepted.append(index)
+
+    rows = [posts[i].model_dump() for i in accepted]
+
+    failed, ids = await _bulk_insert(session, Post, rows, accepted, on_insert=_count_bulk_posts)
+    errors.update(failed)
+    await response_cache.invalidate(
+        *{user_scope(row["user_id"]) for row in rows}, *map(post_scope, ids), USERS_SCOPE, STATS_SCOPE
+    )
+    return errors
 
-def create_refresh_token(session, user_id):
 
+def _add_refresh_token(session, user_id: int, family_id: str) -> str:
     token = security.create_refresh_token()
 
     expire = datetime.now(timezone.utc) + timedelta(
         days=security.ACCESS_TOKEN_EXPIRE_MINUTES
     )
 
-    db_token = RefreshToken(
-        token=token,
+    session.add(RefreshToken(
+        token=security.refresh_token_storage_key(token),
         user_id=user_id,
-        expire_at=expire
-    )
+        expire_at=expire,
+        family_id=family_id
+    ))
 
-    session.add(db_token)
-    session.commit()
-    session.refresh(db_token)
+    # the stored value may be a digest, hand the caller the real token
+    return token
 
-    return db_token
+async def create_refresh_token(session, user_id):
 
-def get_refresh_token(session, token):
+    # a login starts a new token family
+    token = _add_refresh_token(session, user_id, uuid.uuid4().hex)
+    await session.commit()
 
-    stmt = select(RefreshToken).where(RefreshToken.token == token)
-    return session.scalars(stmt).first()
+    return token
 
-def delete_refresh_token(session, token):
+async def get_refresh_token_owner(session, token) -> int | None:
+    """User id behind a live refresh token, without rotating it"""
+    stmt = select(RefreshToken.user_id).where(
+        RefreshToken.token.in_(security.refresh_token_lookup_keys(token)),
+        RefreshToken.revoked.is_(False),
+        RefreshToken.expire_at > datetime.now(timezone.utc)
+    )
+    return (await session.scalars(stmt)).first()
+
+async def rotate_refresh_token(session, token) -> tuple[int, str] | None:
+    """Exchange a live refresh token for a new one in the same family.
+
+    Lookup, expiry check and revocation of the old token are a single
+    UPDATE ... RETURNING; the replacement is inserted in the same
+    transaction. Returns (user_id, new_token), or None if the token is
+    unknown, expired or already used. Presenting an already rotated
+    token means it leaked, so its whole family is revoked.
+    """
+    keys = security.refresh_token_lookup_keys(token)
+
+    result = await session.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token.in_(keys),
+            RefreshToken.revoked.is_(False),
+            RefreshToken.expire_at > datetime.now(timezone.utc)
+        )
+        .values(revoked=True)
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+
+    if row is None:
+        reused_family = (
+            select(RefreshToken.family_id)
+            .where(RefreshToken.token.in_(keys), RefreshToken.revoked.is_(True))
+            .scalar_subquery()
+        )
+        await session.execute(
+            delete(RefreshToken).where(RefreshToken.family_id == reused_family)
+        )
+        await session.commit()
+        return None
+
+    # tokens issued before families existed start one now
+    new_token = _add_refresh_token(session, row.user_id, row.family_id or uuid.uuid4().hex)
+    await session.commit()
+
+    return row.user_id, new_token
+
+async def delete_refresh_token(session, token):
+
+    # one DELETE for the token and the rest of its family (the whole session)
+    keys = security.refresh_token_lookup_keys(token)
+    family = (
+        select(RefreshToken.family_id)
+        .where(RefreshToken.token.in_(keys))
+        .scalar_subquery()
+    )
+
+    await session.execute(
+        delete(RefreshToken).where(
+            or_(RefreshToken.token.in_(keys), RefreshToken.family_id == family)
+        )
+    )
+    await session.commit()
+
+async def revoke_user_refresh_tokens(session, user_id: int) -> int:
+    """End every session of a user; one DELETE on the (user_id, expire_at) index"""
+    result = await session.execute(
+        delete(RefreshToken).where(RefreshToken.user_id == user_id)
+    )
+    await session.commit()
+
+    return result.rowcount
 
-    db_token = get_refresh_token(session, token)
+async def delete_expired_refresh_tokens(session, batch_size: int = 500) -> int:
+    """Delete up to `batch_size` expired tokens in one short transaction; returns rows deleted"""
+    expired = (
+        select(RefreshToken.id)
+        .where(RefreshToken.expire_at < datetime.now(timezone.utc))
+        .limit(batch_size)
+        .scalar_subquery()
+    )
 
-    if db_token:
+    result = await session.execute(
+        delete(RefreshToken).where(RefreshToken.id.in_(expired))
+    )
+    await session.commit()
 
-        session.delete(db_token)
-        session.commit()
\ No newline at end of file
+    return result.rowcount
@@ -1,9 +1,87 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
-DATABASE_URL= "sqlite:///example.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///example.db")
+# same database through an asyncio driver; use postgresql+asyncpg://... for Postgres
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+
+# Pool settings (ignored for in-memory SQLite); per process, so a server
+# with N workers holds up to N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite connection tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+
+# ------------------------------
+# Engine factory
+# ------------------------------
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # readers no longer block the writer, and commits skip an fsync
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # wait for the write lock instead of failing with "database is locked"
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def _engine_options(url: str) -> dict:
+    url = make_url(url)
+    options = {"echo": False}
+
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # in-memory databases live in a single connection, keep SQLAlchemy's pool
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+    if url.get_backend_name() != "sqlite":
+        # server connections can be dropped behind our back
+        options["pool_pre_ping"] = True
+
+    return options
+
+def make_engine(url: str = DATABASE_URL):
+    """Sync engine with pool settings from the environment"""
+    engine = create_engine(url, **_engine_options(url))
 
-engine = create_engine(DATABASE_URL, echo= False, future=True)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+
+    return engine
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL):
+    """Async engine with pool settings from the environment"""
+    engine = create_async_engine(url, **_engine_options(url))
+
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+    return engine
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(
     bind= engine,
@@ -11,6 +89,25 @@ SessionLocal = sessionmaker(
     autocommit = False
 )
 
+async_engine = make_async_engine()
+
+# expire_on_commit=False: attributes can't be lazily reloaded after a
+# commit without an await, so keep what was already loaded
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+def _dispose_after_fork():
+    # pooled connections must not be shared with the parent; close=False
+    # drops the inherited ones without closing the parent's sockets
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
 class Base(DeclarativeBase):
     pass 
 
@@ -21,3 +118,6 @@ def get_session():
     finally:
         session.close()
 
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
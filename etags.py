@@ -0,0 +1,40 @@
+import hashlib
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+# polling clients may keep a copy but must revalidate it on every use
+CACHE_CONTROL = os.getenv("CACHE_CONTROL", "private, no-cache")
+
+
+# ------------------------------
+# Strong validators
+# ------------------------------
+def make_etag(*parts) -> str:
+    """Strong ETag over a representation's watermark (row versions, ids, counts)"""
+    raw = ":".join(str(part) for part in parts).encode("utf-8")
+    return '"' + hashlib.blake2b(raw, digest_size=16).hexdigest() + '"'
+
+def headers(etag: str, vary: Optional[str] = None) -> dict:
+    values = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if vary:
+        values["Vary"] = vary
+    return values
+
+def matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match already names this ETag (weak comparison, as for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    candidates = (candidate.strip() for candidate in header.split(","))
+    return etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+def not_modified(etag: str, vary: Optional[str] = None) -> Response:
+    """304 carrying the validator, sent before any body is built"""
+    return Response(status_code=304, headers=headers(etag, vary))
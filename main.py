@@ -1,154 +1,529 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-import crud, models, schemas
-from database import Base, engine, get_session
-from typing import List
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import configure_mappers
+import crud, schemas
+from database import AsyncSessionLocal, async_engine, engine, get_async_session
+from typing import List, Optional
+import bulk
+import etags
+import metrics
+import pagination
+import ratelimit
+import reaper
+import replicas
+import streaming
 import security
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import datetime, timezone
-#Base.metadata.create_all(bind=engine) # Remove when using alembic
 
-app = FastAPI(title= "User-Post API")
+# pay the first request's one-off costs at startup instead
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+
+async def warm_up():
+    # mapper configuration would otherwise run inside the first query
+    configure_mappers()
+
+    # opens the first pooled connection of the primary and of every
+    # replica, and compiles the hot reads
+    for make_session in (AsyncSessionLocal, *replicas.replica_sessions):
+        async with make_session() as session:
+            await crud.warm_up(session)
+
+    # first validation and dump of the nested response models
+    schemas.UserResponse(
+        id=0, name="", email="warm-up@example.com",
+        posts=[schemas.PostResponse(id=0, title="", content=None, user_id=0)]
+    ).model_dump_json()
+    schemas.user_rows.dump_json([])
+    schemas.post_rows.dump_json([])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STARTUP_WARMUP:
+        await warm_up()
+
+    reaper_task = None
+    if reaper.REAPER_INTERVAL_SECONDS > 0:
+        reaper_task = asyncio.create_task(reaper.run_reaper())
+
+    yield
+
+    if reaper_task:
+        reaper_task.cancel()
+
+app = FastAPI(title= "User-Post API", lifespan=lifespan)
+app.add_middleware(replicas.ReadYourWritesMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+for replica in replicas.replica_engines:
+    metrics.instrument_engine(replica.sync_engine)
+
+
+async def cached_json(
+    request: Request,
+    key: str,
+    scopes: list[str],
+    watermark,
+    render,
+    not_found: str = "Not found"
+) -> Response:
+    """Serve a JSON GET through crud.response_cache.
+
+    `watermark()` returns the ETag inputs, or None if the resource is
+    missing (answered with 404, never cached); None means the ETag is
+    taken from the rendered body. `render()` returns (headers, body), or
+    None if the resource went away in the meantime.
+
+    A hit costs no query at all. On a miss, a revalidating client is
+    checked against the watermark before anything is rendered, then one
+    render per key fills the cache however many requests wait for it.
+
+    A client that has just written reads the primary (see replicas) and
+    bypasses the cache both ways: an entry may have been rendered from a
+    lagging replica after the write, under the new generation.
+    """
+    bypass = crud.response_cache.enabled and replicas.reads_primary(request)
+    use_cache = crud.response_cache.enabled and not bypass
+
+    cache_key = await crud.response_cache.versioned_key(key, scopes)
+    entry = await crud.response_cache.get(cache_key) if use_cache else None
+    status = "HIT"
+
+    if entry is None:
+        status = "BYPASS" if bypass else "MISS"
+
+        if watermark and request.headers.get("if-none-match"):
+            parts = await watermark()
+            if parts is None:
+                raise HTTPException(status_code=404, detail=not_found)
+            etag = etags.make_etag(*parts)
+            if etags.matches(request, etag):
+                return etags.not_modified(etag)
+
+        async def fill():
+            parts = await watermark() if watermark else ()
+            if parts is None:
+                return None
+            rendered = await render()
+            if rendered is None:
+                return None
+            headers, body = rendered
+            etag = etags.make_etag(*parts) if watermark else etags.make_etag(body)
+            return {**headers, "ETag": etag}, body
+
+        if use_cache:
+            entry = await crud.response_cache.load(cache_key, fill)
+        else:
+            entry = await fill()
+
+        if entry is None:
+            raise HTTPException(status_code=404, detail=not_found)
+
+    headers, body = entry
+    if etags.matches(request, headers["ETag"]):
+        return etags.not_modified(headers["ETag"])
+
+    headers = {**headers, **etags.headers(headers["ETag"]), "X-Cache": status}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def parse_ids(ids: str) -> list[int]:
+    """Comma-separated ids, deduplicated in order of first appearance"""
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(parsed) > crud.BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {crud.BATCH_MAX_IDS} ids per request")
+    return parsed
+
+async def render_batch(loader: crud.BatchLoader, ids: list[int], adapter) -> tuple[dict, bytes]:
+    rows = await loader.load_many(ids)
+    return {}, adapter.dump_json({
+        "items": [row for row in rows if row is not None],
+        "missing": [id for id, row in zip(ids, rows) if row is None],
+    })
 
 
 @app.post("/users/", response_model=schemas.UserResponse, status_code=201)
-def create_user (user: schemas.UserCreate, db: Session= Depends(get_session)):
-    if crud.get_user_by_email(db, user.email):
+async def create_user (user: schemas.UserCreate, db: AsyncSession = Depends(get_async_session)):
+    if await crud.get_user_by_email(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db, user)
+    return await crud.create_user(db, user)
+
+@app.post("/users/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_users(
+    request: Request,
+    chunk_size: int = Query(bulk.DEFAULT_CHUNK_SIZE, ge=1, le=bulk.MAX_CHUNK_SIZE),
+    db: AsyncSession = Depends(get_async_session),
+    principal: schemas.TokenData = Depends(security.get_current_principal)
+):
+    # body: one UserCreate JSON object per line; every row costs a bcrypt hash,
+    # so unlike POST /users/ this takes a logged-in caller
+    return await bulk.import_users(db, streaming.ndjson_lines(request.stream()), chunk_size)
 
 @app.get("/users/", response_model=List[schemas.UserResponse])
-def get_users(
-    page: int = 1,
+async def get_users(
+    request: Request,
+    page: int = Query(1, ge=1),
     page_size: int = 10,
-    db: Session = Depends(get_session)
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    posts_limit: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(replicas.get_read_session)
 ):
+    page_size = pagination.page_size_or_limit(page_size, limit)
     skip = (page - 1) * page_size
+    after_id = pagination.decode_cursor(after, 1)[0] if after else None
+
+    async def render():
+        users = await crud.get_users(db, skip, page_size, after_id=after_id, posts_limit=posts_limit)
+        cursor = pagination.next_cursor(users, page_size, "id")
+        return ({"X-Next-Cursor": cursor} if cursor else {}), schemas.user_rows.dump_json(users)
+
+    return await cached_json(
+        request,
+        f"users:{skip}:{page_size}:{after_id}:{posts_limit}",
+        [crud.USERS_SCOPE],
+        None,
+        render
+    )
 
-    return crud.get_users(db, skip, page_size)
+# declared ahead of /users/{user_id}, which would take "batch" for an id
+@app.get("/users/batch", response_model=schemas.UserBatch)
+async def read_users_batch(
+    request: Request,
+    ids: str,
+    posts_limit: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    wanted = parse_ids(ids)
+    loader = crud.BatchLoader(lambda chunk: crud.get_users_by_ids(db, chunk, posts_limit))
+
+    return await cached_json(
+        request,
+        f"users_batch:{posts_limit}:{','.join(map(str, wanted))}",
+        [crud.user_scope(user_id) for user_id in wanted],
+        None,
+        lambda: render_batch(loader, wanted, schemas.user_batch)
+    )
 
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
-def read_user(user_id: int, db: Session = Depends(get_session)):
-    db_user = crud.get_user_by_id(db, user_id)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return db_user
+async def read_user(
+    request: Request,
+    user_id: int,
+    posts_limit: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    async def render():
+        db_user = await crud.get_user_by_id(db, user_id, load_posts=True, posts_limit=posts_limit)
+        if not db_user:
+            return None
+        return {}, schemas.UserResponse.model_validate(db_user).model_dump_json().encode("utf-8")
+
+    return await cached_json(
+        request,
+        f"user:{user_id}:{posts_limit}",
+        [crud.user_scope(user_id)],
+        lambda: crud.get_user_watermark(db, user_id, posts_limit),
+        render,
+        not_found="User not found"
+    )
 
 @app.put("/users/{user_id}", response_model=schemas.UserResponse)
-def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_session)):
-    updated = crud.update_user(db, user_id, user)
+async def update_user(user_id: int, user: schemas.UserUpdate, db: AsyncSession = Depends(get_async_session)):
+    updated = await crud.update_user(db, user_id, user)
     if not updated:
         raise HTTPException(status_code=404, detail="User not found")
     return updated
 
 @app.delete("/users/{user_id}", status_code=204)
-def delete_user(user_id: int, db: Session = Depends(get_session)):
-    success = crud.delete_user(db, user_id)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_session)):
+    success = await crud.delete_user(db, user_id)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
 
 @app.post("/posts/", response_model=schemas.PostResponse, status_code=201)
-def create_post(post: schemas.PostCreate, db: Session = Depends(get_session), current_user: models.User = Depends(security.get_current_user)):
-    return crud.create_post_in_db(
+async def create_post(post: schemas.PostCreate, db: AsyncSession = Depends(get_async_session), principal: schemas.TokenData = Depends(security.get_current_principal)):
+    created = await crud.create_post_in_db(
             db,
             post,
-            current_user.id
+            principal.user_id
         )
+    if created is None:
+        # a valid token whose user has been deleted
+        raise HTTPException(status_code=401, detail="User not found")
+    return created
+
+@app.post("/posts/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_posts(
+    request: Request,
+    chunk_size: int = Query(bulk.DEFAULT_CHUNK_SIZE, ge=1, le=bulk.MAX_CHUNK_SIZE),
+    db: AsyncSession = Depends(get_async_session),
+    principal: schemas.TokenData = Depends(security.get_current_principal)
+):
+    # body: one PostCreate JSON object per line, all owned by the caller
+    return await bulk.import_posts(
+        db,
+        streaming.ndjson_lines(request.stream()),
+        chunk_size,
+        user_id=principal.user_id
+    )
+
+# declared ahead of the other /posts/... reads so "search" is never taken for a path parameter
+@app.get("/posts/search", response_model=List[schemas.PostSearchRow])
+async def search_posts(
+    q: str,
+    limit: int = Query(20, ge=1, le=pagination.MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+
+    posts = await crud.search_posts(db, q, limit, after=pagination.decode_search_cursor(after))
+
+    cursor = pagination.next_cursor(posts, limit, "rank", "id")
+    return pagination.json_page(schemas.post_search_rows.dump_json(posts), cursor)
+
+@app.get("/posts/batch", response_model=schemas.PostBatch)
+async def read_posts_batch(
+    request: Request,
+    ids: str,
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    wanted = parse_ids(ids)
+    loader = crud.BatchLoader(lambda chunk: crud.get_posts_by_ids(db, chunk))
+
+    return await cached_json(
+        request,
+        f"posts_batch:{','.join(map(str, wanted))}",
+        [crud.post_scope(post_id) for post_id in wanted],
+        None,
+        lambda: render_batch(loader, wanted, schemas.post_batch)
+    )
 
 @app.get("/posts/", response_model=List[schemas.PostResponse])
-def read_posts(db: Session = Depends(get_session)):
-    return crud.get_posts(db)
+async def read_posts(
+    request: Request,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    after_id = pagination.decode_cursor(after, 1)[0] if after else None
 
-@app.get("/users/{user_id}/posts", response_model=List[schemas.PostResponse])
-def read_posts_by_user(user_id: int, db: Session = Depends(get_session)):
-    user = crud.get_user_by_id(db, user_id)
+    # an explicit limit asks for a single page
+    if limit:
+        etag = etags.make_etag(*await crud.get_posts_watermark(db, limit, after_id=after_id))
+        if etags.matches(request, etag):
+            return etags.not_modified(etag)
 
-    if not user:
-        raise HTTPException(404, "User not found")
-    return crud.get_posts_by_user(db, user_id)
+        posts = await crud.get_posts(db, limit, after_id=after_id)
+
+        cursor = pagination.next_cursor(posts, limit, "id")
+        return pagination.json_page(schemas.post_rows.dump_json(posts), cursor, etags.headers(etag))
+
+    # otherwise stream the whole table without materializing it
+    media_type = "application/json"
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        media_type = "application/x-ndjson"
+
+    # no ETag: its watermark would aggregate the whole table before the
+    # first byte, which is what streaming avoids; pages carry one
+    rows = crud.stream_posts(db, after_id=after_id)
+    body = streaming.ndjson if media_type == "application/x-ndjson" else streaming.json_array
+
+    return StreamingResponse(
+        body(rows, schemas.post_rows),
+        media_type=media_type,
+        headers={"Vary": "Accept"}
+    )
+
+@app.delete("/posts/{post_id}", status_code=204)
+async def delete_post(
+    post_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    principal: schemas.TokenData = Depends(security.get_current_principal)
+):
+    deleted = await crud.delete_post(db, post_id, principal.user_id)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if not deleted:
+        raise HTTPException(status_code=403, detail="Not the author of this post")
+
+@app.get("/users/{user_id}/posts", response_model=List[schemas.PostResponse])
+async def read_posts_by_user(
+    request: Request,
+    user_id: int,
+    page: int = Query(1, ge=1),
+    page_size: int = 10,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    page_size = pagination.page_size_or_limit(page_size, limit)
+    skip = (page - 1) * page_size
+    after_id = pagination.decode_post_cursor(after, user_id)
+
+    async def watermark():
+        if not await crud.get_user_by_id(db, user_id):
+            return None
+        return await crud.get_posts_by_user_watermark(db, user_id, skip=skip, limit=page_size, after_id=after_id)
+
+    async def render():
+        posts = await crud.get_posts_by_user(db, user_id, skip=skip, limit=page_size, after_id=after_id)
+        cursor = pagination.next_cursor(posts, page_size, "user_id", "id")
+        return ({"X-Next-Cursor": cursor} if cursor else {}), schemas.post_rows.dump_json(posts)
+
+    return await cached_json(
+        request,
+        f"user_posts:{user_id}:{skip}:{page_size}:{after_id}",
+        [crud.user_scope(user_id)],
+        watermark,
+        render,
+        not_found="User not found"
+    )
 
 
 
 
 @app.post("/login", response_model=schemas.TokenPair)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
-    db_user = crud.get_user_by_email(db, form_data.username)
+    # before the session runs its first query and before any bcrypt
+    await ratelimit.check_login(request, form_data.username)
 
-    if not db_user:
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+    db_user = await crud.get_user_by_email(db, form_data.username)
+
+    # unknown emails are checked against a dummy hash: same bcrypt cost,
+    # so response times don't reveal which emails have an account
+    verified = await security.verify_login_password(form_data.password, db_user.password if db_user else None)
 
-    if not security.verify_password(form_data.password, db_user.password):
+    if not db_user or not verified:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     access_token = security.create_access_token(
-        data={"sub": db_user.email}
+        data={"sub": str(db_user.id)}
     )
 
-    refresh_token = crud.create_refresh_token(
+    refresh_token = await crud.create_refresh_token(
         db,
         db_user.id
     )
 
     return {
         "access_token": access_token,
-        "refresh_token": refresh_token.token,
+        "refresh_token": refresh_token,
         "token_type": "bearer"
     }
 
 @app.get("/posts/me", response_model=List[schemas.PostResponse])
-def read_my_posts(
-    page: int = 1,
+async def read_my_posts(
+    page: int = Query(1, ge=1),
     page_size: int = 10,
-    db: Session = Depends(get_session),
-    current_user: models.User = Depends(security.get_current_user)
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(replicas.get_read_session),
+    principal: schemas.TokenData = Depends(security.get_current_principal)
 ):
+    page_size = pagination.page_size_or_limit(page_size, limit)
     skip = (page - 1) * page_size
-    return crud.get_posts_by_user(db, current_user.id, skip=skip, limit=page_size)
+    after_id = pagination.decode_post_cursor(after, principal.user_id)
 
-@app.post("/refresh", response_model=schemas.Token)
-def refresh_token(refresh_token: str, db = Depends(get_session)):
+    posts = await crud.get_posts_by_user(db, principal.user_id, skip=skip, limit=page_size, after_id=after_id)
 
-    db_token = crud.get_refresh_token(db, refresh_token)
-    
-    if not db_token:
+    cursor = pagination.next_cursor(posts, page_size, "user_id", "id")
+    return pagination.json_page(schemas.post_rows.dump_json(posts), cursor)
 
-        raise HTTPException(
-            401,
-            "Invalid refresh token"
-        )
+@app.post("/refresh", response_model=schemas.TokenPair)
+async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_async_session)):
 
-    if db_token.expire_at < datetime.now(timezone.utc):
+    if security.REFRESH_TOKEN_ROTATION:
+        rotated = await crud.rotate_refresh_token(db, refresh_token)
+        user_id, refresh_token = rotated if rotated else (None, None)
+    else:
+        user_id = await crud.get_refresh_token_owner(db, refresh_token)
+
+    if user_id is None:
 
         raise HTTPException(
             401,
-            "Refresh token expired"
+            "Invalid or expired refresh token"
         )
-    
-    user = db_token.user
 
     access_token = security.create_access_token(
-        {"sub": user.email}
+        {"sub": str(user_id)}
     )
 
     return {
 
         "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer"
     }
 
 @app.post("/logout")
-def logout(
+async def logout(
     refresh_token: str,
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_async_session)
 ):
 
-    crud.delete_refresh_token(
+    await crud.delete_refresh_token(
         db,
         refresh_token
     )
 
-    return {"message": "Logged out"}
\ No newline at end of file
+    return {"message": "Logged out"}
+
+@app.post("/logout/all")
+async def logout_all(
+    db: AsyncSession = Depends(get_async_session),
+    principal: schemas.TokenData = Depends(security.get_current_principal)
+):
+
+    await crud.revoke_user_refresh_tokens(db, principal.user_id)
+
+    return {"message": "Logged out of all sessions"}
+
+@app.get("/stats/users", response_model=schemas.UserStats)
+async def user_stats(
+    request: Request,
+    top: int = Query(10, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(replicas.get_read_session)
+):
+    async def render():
+        stats = await crud.get_user_stats(db, top)
+        return {}, schemas.UserStats.model_validate(stats).model_dump_json().encode("utf-8")
+
+    return await cached_json(request, f"user_stats:{top}", [crud.STATS_SCOPE], None, render)
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return {
+        "responses": crud.response_cache.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    # Prometheus text exposition format
+    body = metrics.render({
+        "password_pool": security.password_pool_stats(),
+        "token_service": security.token_service.stats(),
+        "response_cache": crud.response_cache.stats(),
+        "reaper": reaper.reaper_stats(),
+        "read_routing": replicas.replica_stats(),
+        "login_rate_limit": ratelimit.login_rate_limit_stats(),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
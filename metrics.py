@@ -0,0 +1,214 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# requests slower than this are logged with their SQL
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+# statements kept per request for the slow request log
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+# ------------------------------
+# Metric types
+# ------------------------------
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_latency: dict[tuple, Histogram] = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+_size: dict[tuple, Histogram] = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+_requests: dict[tuple, int] = defaultdict(int)
+# per (method, route): totals of what requests spent their time on
+_spent: dict[str, dict[tuple, float]] = {
+    "sql_statements": defaultdict(float),
+    "sql_seconds": defaultdict(float),
+    "bcrypt_seconds": defaultdict(float),
+    "jwt_seconds": defaultdict(float),
+}
+
+
+# ------------------------------
+# Per-request accounting
+# ------------------------------
+@dataclass
+class RequestStats:
+    sql_statements: int = 0
+    sql_seconds: float = 0.0
+    bcrypt_seconds: float = 0.0
+    jwt_seconds: float = 0.0
+    # (seconds, sql) of the first SLOW_REQUEST_MAX_STATEMENTS statements
+    statements: list = field(default_factory=list)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+@contextmanager
+def timer(kind: str):
+    """Add the time spent in the block to the current request's `<kind>_seconds`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            name = f"{kind}_seconds"
+            setattr(stats, name, getattr(stats, name) + time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+
+    # async sessions run this in a greenlet that shares the request's context
+    stats = _current.get()
+    if stats is None:
+        return
+
+    stats.sql_statements += 1
+    stats.sql_seconds += elapsed
+    if len(stats.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+def instrument_engine(engine):
+    """Count and time the statements `engine` runs (pass async_engine.sync_engine for async)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ------------------------------
+# ASGI middleware
+# ------------------------------
+class MetricsMiddleware:
+    """Per-route latency, response size, SQL, bcrypt and JWT time.
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware, so streamed
+    responses are timed until their last chunk and not buffered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            self._record(scope, status, size, elapsed, stats)
+
+    def _record(self, scope, status: int, size: int, elapsed: float, stats: RequestStats):
+        # the route template, not the raw path, keeps label cardinality bounded
+        route = getattr(scope.get("route"), "path", "unmatched")
+        labels = (scope["method"], route)
+
+        _latency[labels].observe(elapsed)
+        _size[labels].observe(size)
+        _requests[(*labels, str(status))] += 1
+        _spent["sql_statements"][labels] += stats.sql_statements
+        _spent["sql_seconds"][labels] += stats.sql_seconds
+        _spent["bcrypt_seconds"][labels] += stats.bcrypt_seconds
+        _spent["jwt_seconds"][labels] += stats.jwt_seconds
+
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            slowest = sorted(stats.statements, key=lambda item: item[0], reverse=True)[:5]
+            logger.warning(
+                "slow request %s %s: %.3fs, %d SQL statements in %.3fs, bcrypt %.3fs, jwt %.3fs%s",
+                scope["method"], scope["path"], elapsed,
+                stats.sql_statements, stats.sql_seconds,
+                stats.bcrypt_seconds, stats.jwt_seconds,
+                "".join(f"\n  {seconds:.4f}s {sql}" for seconds, sql in slowest)
+            )
+
+
+# ------------------------------
+# Prometheus text exposition
+# ------------------------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _histogram_lines(name: str, histograms: dict, help_text: str) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+
+    for (method, route), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {histogram.count}")
+
+    return lines
+
+def render(gauges: Optional[dict[str, dict]] = None) -> str:
+    """Everything recorded so far, plus numeric values of `gauges` ({prefix: stats dict})"""
+    lines = _histogram_lines(
+        "http_request_duration_seconds", _latency, "Request latency by route"
+    )
+    lines += _histogram_lines(
+        "http_response_size_bytes", _size, "Response body size by route"
+    )
+
+    lines += ["# HELP http_requests_total Requests by route and status", "# TYPE http_requests_total counter"]
+    for (method, route, status), count in sorted(_requests.items()):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    for kind, totals in _spent.items():
+        name = f"http_request_{kind}_total"
+        lines += [f"# HELP {name} Total {kind.replace('_', ' ')} of requests by route", f"# TYPE {name} counter"]
+        for (method, route), value in sorted(totals.items()):
+            lines.append(f"{name}{_labels(method=method, route=route)} {value}")
+
+    for prefix, stats in (gauges or {}).items():
+        for key, value in stats.items():
+            # skip labels such as the active JWT key id
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {float(value)}")
+
+    return "\n".join(lines) + "\n"
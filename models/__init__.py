@@ -1,3 +1,7 @@
+"""The model registry: every mapped class is imported here, so string
+relationship targets ("Post", "User") resolve whichever module asks first"""
 from .user import User
 from .post import Post
-from .refresh_token import RefreshToken
\ No newline at end of file
+from .refresh_token import RefreshToken
+
+__all__ = ["User", "Post", "RefreshToken"]
@@ -1,14 +1,25 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, ForeignKey
+from sqlalchemy import Integer, String, ForeignKey, Index
 from database import Base
 
 class Post(Base):
     __tablename__ = "posts"
+    # serves WHERE user_id = ? ORDER BY id (listings, keyset pages) and the FK
+    __table_args__ = (
+        Index("ix_posts_user_id_id", "user_id", "id"),
+        # ids are never handed out twice, so the watermarks behind the post
+        # ETags change when a deleted post is followed by a new one
+        {"sqlite_autoincrement": True},
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key= True, index= True)
     title: Mapped[str] = mapped_column(String(100), nullable= False)
     content: Mapped[str] = mapped_column(String(500)) 
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    # bumped by the ORM on every UPDATE; part of the post listings' ETags
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     author: Mapped["User"] = relationship("User", back_populates="posts")
 
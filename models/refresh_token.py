@@ -3,7 +3,7 @@ from datetime import datetime
 from sqlalchemy.sql import func
 
 from typing import Optional
-from sqlalchemy import String, ForeignKey, DateTime, Integer
+from sqlalchemy import Boolean, String, ForeignKey, DateTime, Integer, Index, false
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database import Base
 
@@ -11,11 +11,20 @@ from database import Base
 class RefreshToken (Base):
     
     __tablename__ = "refresh_tokens"
+    # per-user token lookups and the ON DELETE CASCADE from users
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id_expire_at", "user_id", "expire_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index= True)
     token: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    expire_at: Mapped[datetime] = mapped_column(DateTime(timezone=True),nullable=False)
+    # indexed for the expired-token reaper
+    expire_at: Mapped[datetime] = mapped_column(DateTime(timezone=True),nullable=False, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(),nullable=False)
+    # every token rotated out of the same login shares a family
+    family_id: Mapped[Optional[str]] = mapped_column(String(32), index=True, nullable=True)
+    # rotated-out tokens are kept, revoked, so a replay can be detected
+    revoked: Mapped[bool] = mapped_column(Boolean, server_default=false(), default=False, nullable=False)
     user: Mapped["User"] = relationship(back_populates="refresh_tokens")
 
@@ -22,7 +22,21 @@ class User (Base):
         unique=True
     )
     password: Mapped[str] = mapped_column(String(255), nullable=False)  # ✅ Add this
-    
+
+    # denormalized count of the user's posts, maintained by crud; indexed for
+    # the top authors and histogram queries of GET /stats/users
+    post_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        index=True
+    )
+
+    # bumped by the ORM on every UPDATE; feeds the ETag of GET /users/{id}
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     posts: Mapped[List["Post"]] = relationship("Post", back_populates="author", cascade="all, delete-orphan")
     refresh_tokens: Mapped[list["RefreshToken"]] = relationship(back_populates="user", cascade="all, delete-orphan")
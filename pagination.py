@@ -0,0 +1,76 @@
+import base64
+import binascii
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+# largest page a listing serves: a bigger `limit` is a 422, a bigger
+# old-style `page_size` is cut down to it
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+
+def page_size_or_limit(page_size: int, limit: Optional[int]) -> int:
+    """Rows per page: `limit` if given, else `page_size` clamped to 1..MAX_PAGE_SIZE.
+
+    `limit` is new and bounded by its Query; `page_size` always took any
+    value, so old clients get a smaller page rather than a 422.
+    """
+    return limit or max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+# ------------------------------
+# Opaque keyset cursors
+# ------------------------------
+def encode_cursor(*keys: int | float) -> str:
+    """Pack the sort key of the last row of a page into an opaque cursor"""
+    # str() of a float round-trips exactly
+    raw = ":".join(str(key) for key in keys).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, size: int, types: tuple = ()) -> tuple:
+    """Unpack a cursor made by encode_cursor, expecting `size` keys (ints unless `types` says otherwise)"""
+    types = types or (int,) * size
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        parts = raw.split(":")
+        if len(parts) != size:
+            raise ValueError(raw)
+        keys = tuple(type_(part) for type_, part in zip(types, parts))
+    except (ValueError, UnicodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return keys
+
+def decode_post_cursor(cursor: Optional[str], user_id: int) -> Optional[int]:
+    """Post cursors carry (user_id, id); reject ones minted for another user"""
+    if cursor is None:
+        return None
+
+    cursor_user_id, post_id = decode_cursor(cursor, 2)
+    if cursor_user_id != user_id:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return post_id
+
+def decode_search_cursor(cursor: Optional[str]) -> Optional[tuple[float, int]]:
+    """Search cursors carry (rank, id)"""
+    if cursor is None:
+        return None
+    return decode_cursor(cursor, 2, (float, int))
+
+def next_cursor(rows: list[dict], limit: int, *key_attrs: str) -> Optional[str]:
+    """Cursor pointing after the last row, or None when this is the last page"""
+    if not rows or len(rows) < limit:
+        return None
+
+    last = rows[-1]
+    return encode_cursor(*(last[attr] for attr in key_attrs))
+
+def json_page(body: bytes, cursor: Optional[str], headers: Optional[dict] = None) -> Response:
+    """Pre-serialized JSON page, with the cursor of the next one if any"""
+    headers = dict(headers or {})
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    return Response(content=body, media_type="application/json", headers=headers)
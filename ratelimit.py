@@ -0,0 +1,99 @@
+"""Sliding-window rate limits for /login.
+
+Attempts are counted per username and per client IP. Over either limit,
+the request gets a 429 before any query or bcrypt work. The counters live
+in a cache backend: the process-local LRU by default, or a shared Redis
+(LOGIN_RATE_LIMIT_URL) so every worker sees the same counts. Tests can
+pass cache.MemoryBackend() or RedisBackend(client=<fake>) instead.
+"""
+import math
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+
+import cache
+
+# attempts allowed per window; 0 disables that limit
+LOGIN_RATE_LIMIT_PER_USER = int(os.getenv("LOGIN_RATE_LIMIT_PER_USER", "10"))
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "100"))
+LOGIN_RATE_LIMIT_WINDOW = float(os.getenv("LOGIN_RATE_LIMIT_WINDOW", "60"))
+# counters kept by the local backend; the oldest go first
+LOGIN_RATE_LIMIT_SIZE = int(os.getenv("LOGIN_RATE_LIMIT_SIZE", "100000"))
+LOGIN_RATE_LIMIT_URL = os.getenv("LOGIN_RATE_LIMIT_URL")
+
+
+class SlidingWindowLimiter:
+    """At most `limit` hits per `window` seconds and key.
+
+    A sliding window counter: hits are counted in fixed windows, and the
+    previous window's count is weighted by how much of it still overlaps
+    the sliding one. Two small counters per key instead of a log of
+    timestamps, and one atomic increment per hit on the shared backend.
+    Every hit counts, rejected ones included.
+    """
+
+    def __init__(self, namespace: str, backend: cache.CacheBackend, limit: int, window: float):
+        self.namespace = namespace
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+        self.allowed = 0
+        self.rejected = 0
+
+    async def hit(self, key: str) -> Optional[float]:
+        """Count a hit; None if allowed, else seconds to wait before retrying"""
+        if self.limit <= 0:
+            return None
+
+        now = time.time()
+        index, offset = divmod(now, self.window)
+        prefix = f"{self.namespace}:{key}"
+
+        previous = int(await self.backend.get(f"{prefix}:{int(index) - 1}") or 0)
+        # kept long enough to serve as the previous window of the next one
+        current = await self.backend.incr(f"{prefix}:{int(index)}", 2 * self.window)
+
+        estimate = previous * (1 - offset / self.window) + current
+        if estimate <= self.limit:
+            self.allowed += 1
+            return None
+
+        self.rejected += 1
+        # once this window ends, the weight of its hits starts to drop
+        return self.window - offset
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "window": self.window, "allowed": self.allowed, "rejected": self.rejected}
+
+
+_backend = cache.make_backend(LOGIN_RATE_LIMIT_URL, LOGIN_RATE_LIMIT_SIZE)
+
+login_by_user = SlidingWindowLimiter("login:user", _backend, LOGIN_RATE_LIMIT_PER_USER, LOGIN_RATE_LIMIT_WINDOW)
+login_by_ip = SlidingWindowLimiter("login:ip", _backend, LOGIN_RATE_LIMIT_PER_IP, LOGIN_RATE_LIMIT_WINDOW)
+
+
+def client_ip(request: Request) -> str:
+    # behind a proxy, run uvicorn with --forwarded-allow-ips so this is the real client
+    return request.client.host if request.client else "unknown"
+
+async def check_login(request: Request, username: str):
+    """Raise 429 if this IP or this username has made too many login attempts"""
+    retry_after = await login_by_ip.hit(client_ip(request))
+    if retry_after is None:
+        # usernames are emails, which match case-insensitively
+        retry_after = await login_by_user.hit(username.strip().lower())
+
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+def login_rate_limit_stats() -> dict:
+    return {
+        **{f"user_{key}": value for key, value in login_by_user.stats().items()},
+        **{f"ip_{key}": value for key, value in login_by_ip.stats().items()},
+    }
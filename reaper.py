@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import os
+import time
+
+import crud
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# seconds between runs of the background reaper; 0 disables it
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "300"))
+# rows per DELETE, small enough that the write lock is only held briefly
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "500"))
+
+_stats = {
+    "runs": 0,
+    "last_run_reaped": 0,
+    "last_run_seconds": 0.0,
+    "reaped_total": 0,
+}
+
+
+async def reap_expired_tokens(batch_size: int = REAPER_BATCH_SIZE) -> int:
+    """Delete every expired refresh token, one small batch per transaction"""
+    started = time.perf_counter()
+    reaped = 0
+
+    while True:
+        async with AsyncSessionLocal() as session:
+            deleted = await crud.delete_expired_refresh_tokens(session, batch_size)
+
+        reaped += deleted
+        if deleted < batch_size:
+            break
+
+        # let queued writers take the lock between batches
+        await asyncio.sleep(0)
+
+    _stats["runs"] += 1
+    _stats["last_run_reaped"] = reaped
+    _stats["last_run_seconds"] = time.perf_counter() - started
+    _stats["reaped_total"] += reaped
+
+    return reaped
+
+async def run_reaper(interval: float = REAPER_INTERVAL_SECONDS):
+    """Reap expired tokens every `interval` seconds until cancelled"""
+    while True:
+        try:
+            reaped = await reap_expired_tokens()
+            if reaped:
+                logger.info("reaped %d expired refresh tokens", reaped)
+        except Exception:
+            logger.exception("refresh token reaper failed")
+
+        await asyncio.sleep(interval)
+
+def reaper_stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,157 @@
+"""Read replicas for the GET routes.
+
+REPLICA_DATABASE_URLS lists replica databases (comma-separated, sync or
+async URLs as for DATABASE_URL). Routes that only read take their session
+from get_read_session, which picks a replica round-robin or by fewest
+sessions open (READ_ROUTING). Writes always go to the primary.
+
+Read-your-writes: a successful write answers with a cookie that sends the
+same client's reads to the primary for READ_YOUR_WRITES_SECONDS, long
+enough to cover replication lag; those reads bypass the response cache
+too (see main.cached_json). Other clients may read stale data for as
+long as a replica lags, plus RESPONSE_CACHE_TTL for cached responses
+filled from a lagging replica.
+
+To try it locally, copy the SQLite database and point the replicas at the
+copies; they never catch up, which makes the routing easy to see:
+
+    sqlite3 example.db ".backup replica1.db"
+    REPLICA_DATABASE_URLS=sqlite:///replica1.db uvicorn main:app
+"""
+import itertools
+import os
+import time
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import AsyncSessionLocal, make_async_engine
+
+REPLICA_DATABASE_URLS = [
+    url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()
+]
+# round_robin or least_loaded (fewest sessions open)
+READ_ROUTING = os.getenv("READ_ROUTING", "round_robin")
+# after a write, the client's reads go to the primary for this long; 0 disables
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+if READ_ROUTING not in ("round_robin", "least_loaded"):
+    raise ValueError(f"READ_ROUTING must be round_robin or least_loaded, not {READ_ROUTING!r}")
+
+
+def _async_url(url: str) -> str:
+    # same default as database.ASYNC_DATABASE_URL
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1) if url.startswith("sqlite://") else url
+
+
+# ------------------------------
+# Replica engines
+# ------------------------------
+replica_engines = [make_async_engine(_async_url(url)) for url in REPLICA_DATABASE_URLS]
+
+replica_sessions = [
+    async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    for engine in replica_engines
+]
+
+def _dispose_after_fork():
+    # see database._dispose_after_fork
+    for engine in replica_engines:
+        engine.sync_engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+_next = itertools.count()
+_open = [0] * len(replica_engines)
+_reads = [0] * len(replica_engines)
+_primary_reads = 0
+
+
+# ------------------------------
+# Routing
+# ------------------------------
+def pick_replica() -> int | None:
+    """Index of the replica for the next read, None without replicas"""
+    if not replica_engines:
+        return None
+
+    start = next(_next) % len(replica_engines)
+    if READ_ROUTING == "round_robin":
+        return start
+
+    # fewest open sessions; ties go round-robin so idle replicas share the load
+    order = [(start + offset) % len(replica_engines) for offset in range(len(replica_engines))]
+    return min(order, key=lambda index: _open[index])
+
+def reads_primary(request: Request) -> bool:
+    """Whether the client wrote recently enough to need the primary"""
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def get_read_session(request: Request):
+    """Session for routes that only read: a replica, unless there are none
+    or the client has just written"""
+    global _primary_reads
+
+    index = None if reads_primary(request) else pick_replica()
+
+    if index is None:
+        _primary_reads += 1
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    _open[index] += 1
+    _reads[index] += 1
+    try:
+        async with replica_sessions[index]() as session:
+            yield session
+    finally:
+        _open[index] -= 1
+
+
+# ------------------------------
+# Read-your-writes cookie
+# ------------------------------
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class ReadYourWritesMiddleware:
+    """Set READ_PRIMARY_COOKIE on successful writes (pure ASGI, like metrics)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] in SAFE_METHODS
+            or not replica_engines
+            or READ_YOUR_WRITES_SECONDS <= 0
+        ):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time() + READ_YOUR_WRITES_SECONDS) + 1
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={until}; Max-Age={int(READ_YOUR_WRITES_SECONDS) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def replica_stats() -> dict:
+    stats = {"replicas": len(replica_engines), "primary_reads": _primary_reads}
+    for index in range(len(replica_engines)):
+        stats[f"replica{index}_reads"] = _reads[index]
+        stats[f"replica{index}_open"] = _open[index]
+    return stats
@@ -1,19 +1,28 @@
 from __future__ import annotations
-from pydantic import BaseModel, EmailStr, constr
+from pydantic import AfterValidator, BaseModel, EmailStr, TypeAdapter, constr
 from typing import List, Optional
+from typing_extensions import Annotated, TypedDict
 
 
+def _within_bcrypt_limit(password: str) -> str:
+    # max_length counts characters, bcrypt takes at most 72 bytes
+    if len(password.encode("utf-8")) > 72:
+        raise ValueError("Password must be at most 72 bytes in UTF-8")
+    return password
+
+Password = Annotated[constr(min_length=8, max_length=72), AfterValidator(_within_bcrypt_limit)]
+
 class UserCreate (BaseModel):
 
     name: str
     email: EmailStr
-    password: constr(min_length=8, max_length=72)  # plain text from user, will be hashed
+    password: Password  # plain text from user, will be hashed
 
 class UserUpdate(BaseModel):
 
     name: str | None = None
     email: EmailStr | None = None
-    password: constr(min_length=8, max_length=72) | None = None  # optional update
+    password: Password | None = None  # optional update
 
 
 
@@ -22,6 +31,7 @@ class UserResponse(BaseModel):
     id: int
     name: str
     email: EmailStr
+    post_count: int = 0
     posts: List[PostResponse] = []
     
     class Config:
@@ -41,6 +51,74 @@ class PostResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Row shapes for the list endpoints. crud returns these as plain dicts
+# selected column by column, and the adapters dump them straight to JSON
+# bytes; no from_attributes validation of ORM objects on the way out.
+class PostRow(TypedDict):
+    id: int
+    title: str
+    content: Optional[str]
+    user_id: int
+
+class UserRow(TypedDict):
+    id: int
+    name: Optional[str]
+    email: str
+    post_count: int
+    posts: List[PostRow]
+
+post_rows = TypeAdapter(List[PostRow])
+
+class PostSearchRow(PostRow):
+    # lower is better; opaque, only meaningful within one query
+    rank: float
+    # HTML-escaped excerpt with the matches wrapped in <mark>
+    snippet: Optional[str]
+
+post_search_rows = TypeAdapter(List[PostSearchRow])
+user_rows = TypeAdapter(List[UserRow])
+
+# GET /users/batch and /posts/batch: the rows found, in request order, and
+# the requested ids that don't exist
+class UserBatch(TypedDict):
+    items: List[UserRow]
+    missing: List[int]
+
+class PostBatch(TypedDict):
+    items: List[PostRow]
+    missing: List[int]
+
+user_batch = TypeAdapter(UserBatch)
+post_batch = TypeAdapter(PostBatch)
+
+class TopAuthor(BaseModel):
+    id: int
+    name: Optional[str]
+    post_count: int
+
+class PostCountBucket(BaseModel):
+    # users with min <= post_count < max; max is None for the last bucket
+    min: int
+    max: Optional[int]
+    users: int
+
+class UserStats(BaseModel):
+    users: int
+    posts: int
+    top_authors: List[TopAuthor]
+    post_count_histogram: List[PostCountBucket]
+
+class PostImport(PostCreate):
+    user_id: int
+
+class BulkRowError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int = 0
+    errors: List[BulkRowError] = []
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -51,6 +129,7 @@ class TokenPair(Token):
     token_type: str = "bearer"
 
 class TokenData(BaseModel):
+    user_id: Optional[int] = None
     email: Optional[str] = None
 
 
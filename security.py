@@ -1,92 +1,276 @@
+import asyncio
 import bcrypt
-from datetime import datetime, timedelta
+import functools
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from typing import Optional
-import jwt
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_session
+from schemas import TokenData
+import metrics
 import secrets
+from tokens import TokenService
 
 oauth2_schema = OAuth2PasswordBearer(tokenUrl="login")
 
 # JWT settings
-SECRET_KEY = "your-super-secret-key"  # change this in production
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key")  # change this in production
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# Password hashing settings
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+# jobs allowed to wait for a worker before we answer 503
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
+# Refresh token settings
+# store a SHA-256 digest of each refresh token instead of the token itself
+REFRESH_TOKEN_HASHING = os.getenv("REFRESH_TOKEN_HASHING", "false").lower() in ("1", "true", "yes")
+# issue a new refresh token on every /refresh and revoke the presented one
+REFRESH_TOKEN_ROTATION = os.getenv("REFRESH_TOKEN_ROTATION", "true").lower() in ("1", "true", "yes")
 
 # ------------------------------
 # Password hashing with bcrypt
 # ------------------------------
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
-    # truncate to 72 bytes (bcrypt limitation)
-    pw = password[:72].encode("utf-8")
-    hashed = bcrypt.hashpw(pw, bcrypt.gensalt())
+    # truncate to 72 bytes (bcrypt limitation; bcrypt 5 raises beyond it)
+    pw = password.encode("utf-8")[:72]
+    hashed = bcrypt.hashpw(pw, bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
     return hashed.decode("utf-8")
 
+# cost of the last stored hash a login checked: hashes keep the cost they
+# were made with, so after BCRYPT_ROUNDS changes most of them still carry
+# the old one until their users are rehashed
+_stored_rounds = BCRYPT_ROUNDS
+
+def _rounds_of(hashed: str) -> Optional[int]:
+    """Cost of a "$2b$12$..." hash, or None if it isn't one"""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+@functools.lru_cache(maxsize=None)
+def _dummy_password_hash(rounds: int) -> str:
+    # a well-formed hash (a fresh salt and a digest nothing produces) that
+    # needs no hashing to make
+    return (bcrypt.gensalt(rounds=rounds) + b"." * 31).decode("utf-8")
+
+def dummy_password_hash() -> str:
+    """Hash to check when a login names an unknown email, so that costs as
+    much as a wrong password: it has the cost of the stored hashes logins
+    have been checking (BCRYPT_ROUNDS until the first one).
+    """
+    return _dummy_password_hash(_stored_rounds)
+
 def verify_password(plain_password: str, hashed: str) -> bool:
     """Verify a password against its hash"""
     return bcrypt.checkpw(
-        plain_password[:72].encode("utf-8"),
+        plain_password.encode("utf-8")[:72],
         hashed.encode("utf-8")
     )
 
+# ------------------------------
+# Bounded worker pool for bcrypt
+# ------------------------------
+# bcrypt releases the GIL, so a small dedicated thread pool runs hashes in
+# parallel without starving the default threadpool or the event loop
+def _make_password_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=PASSWORD_WORKERS,
+        thread_name_prefix="bcrypt"
+    )
+
+_password_pool = _make_password_pool()
+_password_jobs = 0
+
+def _reset_password_pool():
+    # a forked worker inherits the executor but not its threads, and may
+    # inherit the lock held by one of them
+    global _password_pool, _password_jobs, _password_stats_lock
+    _password_pool = _make_password_pool()
+    _password_jobs = 0
+    _password_stats_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_password_pool)
+
+_password_stats = {
+    "rejected": 0,
+    "completed": 0,
+    "hash_seconds_total": 0.0,
+    "wait_seconds_total": 0.0,
+}
+# _timed runs on the pool threads; += on the shared totals would lose updates
+_password_stats_lock = threading.Lock()
+
+def _timed(func, submitted: float, *args):
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        finished = time.perf_counter()
+        with _password_stats_lock:
+            _password_stats["wait_seconds_total"] += started - submitted
+            _password_stats["hash_seconds_total"] += finished - started
+            _password_stats["completed"] += 1
+
+async def _submit_password_job(func, *args):
+    global _password_jobs
+
+    _password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # what the request waited, queueing included
+        with metrics.timer("bcrypt"):
+            return await loop.run_in_executor(
+                _password_pool, _timed, func, time.perf_counter(), *args
+            )
+    finally:
+        _password_jobs -= 1
+
+async def _run_password_job(func, *args):
+    # back-pressure: every worker busy and the queue full
+    if _password_jobs >= PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT:
+        _password_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, try again later",
+            headers={"Retry-After": "1"}
+        )
+
+    return await _submit_password_job(func, *args)
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the bcrypt pool; raises 503 when the pool is saturated"""
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed: str) -> bool:
+    """verify_password on the bcrypt pool; raises 503 when the pool is saturated"""
+    return await _run_password_job(verify_password, plain_password, hashed)
+
+async def verify_login_password(plain_password: str, hashed: Optional[str]) -> bool:
+    """verify_password_async for a login; `hashed` is None for an unknown
+    email, which is checked against dummy_password_hash() and refused
+    """
+    global _stored_rounds
+    if hashed is None:
+        await verify_password_async(plain_password, dummy_password_hash())
+        return False
+
+    _stored_rounds = _rounds_of(hashed) or _stored_rounds
+    return await verify_password_async(plain_password, hashed)
+
+async def hash_passwords_bulk(passwords: list[str]) -> list[str | ValueError]:
+    """Hash many passwords on the bcrypt pool, for imports.
+
+    At most PASSWORD_WORKERS of them are in flight at a time, counted
+    like any other job: a login queues behind one round of import hashes
+    at worst, never behind the whole import. The import waits for the
+    pool instead of being rejected by PASSWORD_QUEUE_LIMIT.
+
+    A password bcrypt rejects comes back as its ValueError, in place of
+    the hash, so one bad row doesn't fail the others.
+    """
+    window = asyncio.Semaphore(PASSWORD_WORKERS)
+
+    async def hash_one(password: str) -> str | ValueError:
+        async with window:
+            try:
+                return await _submit_password_job(hash_password, password)
+            except ValueError as exc:
+                return exc
+
+    return await asyncio.gather(*(hash_one(password) for password in passwords))
+
+def password_pool_stats() -> dict:
+    """Snapshot of the bcrypt pool: queue depth, in-flight jobs and latency totals"""
+    with _password_stats_lock:
+        totals = dict(_password_stats)
+    return {
+        "workers": PASSWORD_WORKERS,
+        "in_flight": _password_jobs,
+        "queue_depth": max(0, _password_jobs - PASSWORD_WORKERS),
+        **totals,
+    }
+
 # ------------------------------
 # JWT token functions
 # ------------------------------
+# keys are parsed once here; see tokens.TokenService.from_env for rotation
+token_service = TokenService.from_env(SECRET_KEY, ALGORITHM)
+
 def create_access_token(data: dict, expire_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expire_delta if expire_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with metrics.timer("jwt"):
+        return token_service.sign(
+            data,
+            expire_delta if expire_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
 
 def decode_access_token(token: str):
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.PyJWTError:
-        return None
-    
+    # None for invalid or expired tokens
+    with metrics.timer("jwt"):
+        return token_service.verify(token)
+
+async def get_current_principal(token: str = Depends(oauth2_schema)) -> TokenData:
+    """Resolve the caller from the token claims alone, without touching the database.
 
+    A coroutine so it runs on the event loop: a plain def would go to the
+    threadpool, where concurrent requests race on token_service's
+    unlocked verify cache.
 
-def get_current_user(token: str = Depends(oauth2_schema),
-                      db: Session = Depends(get_session)):
-    from crud import get_user_by_email
+    Every authenticated route takes this, none needs more than the id. A
+    token outliving its user still passes; writes that need the user row
+    notice it is gone (see crud.create_post_in_db).
+    """
     #1- Client sends request
     #2- Token extracted
     #3- Token decoded
-    #4- Email extracted
-    #5- User fetched
-    #6- User returned
-    
+    #4- User id extracted
+
     payload = decode_access_token(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
-    email = payload.get("sub")
-    
-    if email is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token payload"
-        )
-    
-    user = get_user_by_email(db, email)
+    subject = payload.get("sub")
 
-    if not user:
+    if subject is None or not subject.isdigit():
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            detail="Invalid token payload"
         )
 
-    return user
+    return TokenData(user_id=int(subject))
 
 
 def create_refresh_token():
 
-    return secrets.token_urlsafe(64)
\ No newline at end of file
+    return secrets.token_urlsafe(64)
+
+def _refresh_token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def refresh_token_storage_key(token: str) -> str:
+    """Value written to refresh_tokens.token for a newly issued token"""
+    if REFRESH_TOKEN_HASHING:
+        # fixed 64 chars instead of 86, and a leaked table can't be replayed
+        return _refresh_token_digest(token)
+    return token
+
+def refresh_token_lookup_keys(token: str) -> list[str]:
+    """Stored forms a presented token may have, whichever mode wrote the row"""
+    keys = [_refresh_token_digest(token)]
+
+    # issued tokens are 86 chars; never accept a bare digest as a raw token
+    if len(token) != len(keys[0]):
+        keys.append(token)
+
+    return keys
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""Production entry point: N uvicorn workers forked from a preloaded app.
+
+    python serve.py [--host 0.0.0.0] [--port 8000] [--workers N]
+
+The parent imports main once and binds the listening socket, then forks
+the workers; they share the imported code copy-on-write but nothing else.
+Each worker has its own event loop, connection pools (see
+database._dispose_after_fork), bcrypt pool and caches, and runs the app's
+lifespan (warm-up, reaper) itself. Per-process settings such as
+DB_POOL_SIZE or PASSWORD_WORKERS therefore add up over the workers.
+
+State that must be shared needs a shared backend once there are several
+workers: without RESPONSE_CACHE_URL the response cache is turned off (a
+write would only invalidate its own worker's copies), and without
+LOGIN_RATE_LIMIT_URL each worker counts login attempts on its own, so
+the limits are up to N times looser; both are logged at startup.
+
+SIGTERM or SIGINT drains: workers stop accepting connections, finish the
+requests in flight (for up to GRACEFUL_TIMEOUT seconds) and run the
+lifespan shutdown. A second signal makes them exit right away. A worker
+that dies is replaced, unless it failed to start.
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+
+import uvicorn
+from uvicorn.server import Server
+
+logger = logging.getLogger("uvicorn.error")
+
+HOST = os.getenv("HOST", "127.0.0.1")
+PORT = int(os.getenv("PORT", "8000"))
+# one worker per core unless told otherwise
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# seconds a draining worker waits for requests in flight
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# uvicorn's exit code when the lifespan startup fails
+STARTUP_FAILURE = 3
+
+
+def _run_worker(config: uvicorn.Config, sock) -> int:
+    # own process group: a terminal's Ctrl+C reaches the parent only,
+    # which forwards it exactly once
+    os.setpgid(0, 0)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+
+    Server(config).run(sockets=[sock])
+    return 0
+
+def spawn_worker(config: uvicorn.Config, sock) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    code = 1
+    try:
+        code = _run_worker(config, sock)
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else 1
+    except BaseException:
+        logger.exception("worker %d crashed", os.getpid())
+    finally:
+        # never fall back into the parent's loop
+        logging.shutdown()
+        os._exit(code)
+
+def _signal_all(pids, sig: int):
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+def check_shared_state(workers: int):
+    """Turn off or warn about per-process state that breaks with several workers"""
+    import crud
+    import ratelimit
+
+    if crud.response_cache.enabled and not crud.RESPONSE_CACHE_URL:
+        logger.warning(
+            "RESPONSE_CACHE_URL is not set, response cache disabled: with %d workers, "
+            "a write would leave the other workers serving stale responses and 304s",
+            workers
+        )
+        # before the fork, so every worker inherits it
+        crud.response_cache.ttl = 0
+
+    limited = ratelimit.LOGIN_RATE_LIMIT_PER_USER > 0 or ratelimit.LOGIN_RATE_LIMIT_PER_IP > 0
+    if limited and not ratelimit.LOGIN_RATE_LIMIT_URL:
+        logger.warning(
+            "LOGIN_RATE_LIMIT_URL is not set: each of the %d workers counts login attempts "
+            "on its own, so the login rate limits are up to %d times higher",
+            workers, workers
+        )
+
+def serve(host: str, port: int, workers: int, log_level: str = "info", access_log: bool = False) -> int:
+    config = uvicorn.Config(
+        "main:app",
+        host=host,
+        port=port,
+        log_level=log_level,
+        access_log=access_log,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+    # preload: import the app before forking, once for all workers
+    config.load()
+    sock = config.bind_socket()
+
+    if "SECRET_KEY" not in os.environ and "JWT_KEYS" not in os.environ:
+        logger.warning("SECRET_KEY is not set, tokens are signed with the development key")
+    if workers > 1:
+        check_shared_state(workers)
+
+    received: list[int] = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: received.append(signum))
+
+    pids = {spawn_worker(config, sock) for _ in range(workers)}
+    logger.info("serving with %d workers: %s", workers, sorted(pids))
+
+    exit_code = 0
+    forwarded = 0
+    deadline = None
+
+    while pids:
+        if len(received) > forwarded:
+            # first signal: drain; any later one: uvicorn's forced exit
+            _signal_all(pids, signal.SIGTERM if not forwarded else signal.SIGINT)
+            forwarded = len(received)
+            if deadline is None:
+                logger.info("draining %d workers", len(pids))
+                deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+
+        if deadline is not None and time.monotonic() > deadline:
+            logger.error("workers %s did not drain in time, killing them", sorted(pids))
+            _signal_all(pids, signal.SIGKILL)
+            deadline = float("inf")
+
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if not pid:
+            time.sleep(0.1)
+            continue
+
+        pids.discard(pid)
+        if deadline is not None:
+            continue
+
+        code = os.waitstatus_to_exitcode(status)
+        if code == STARTUP_FAILURE:
+            # replacing it would only fail again
+            logger.error("worker %d failed to start, shutting down", pid)
+            exit_code = 1
+            received.append(signal.SIGTERM)
+            continue
+
+        replacement = spawn_worker(config, sock)
+        pids.add(replacement)
+        logger.warning("worker %d exited (%s), started %d", pid, code, replacement)
+
+    sock.close()
+    logger.info("all workers stopped")
+    return exit_code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the User-Post API with preforked workers")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    return serve(args.host, args.port, max(1, args.workers), args.log_level, args.access_log)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+from typing import AsyncIterable, AsyncIterator
+
+from pydantic import TypeAdapter
+
+
+# rows are buffered into chunks so the server doesn't flush one tiny
+# write per row
+CHUNK_ROWS = 200
+
+
+async def _chunks(rows: AsyncIterable[dict]) -> AsyncIterator[list[dict]]:
+    buffer = []
+
+    async for row in rows:
+        buffer.append(row)
+
+        if len(buffer) >= CHUNK_ROWS:
+            yield buffer
+            buffer = []
+
+    if buffer:
+        yield buffer
+
+async def json_array(rows: AsyncIterable[dict], adapter: TypeAdapter) -> AsyncIterator[bytes]:
+    """Encode dict rows as a JSON array, emitted chunk by chunk.
+
+    `adapter` is a TypeAdapter for a list of rows, e.g. schemas.post_rows.
+    """
+    yield b"["
+    first = True
+
+    async for chunk in _chunks(rows):
+        # dump the chunk as an array and drop its brackets
+        body = adapter.dump_json(chunk)[1:-1]
+        yield body if first else b"," + body
+        first = False
+
+    yield b"]"
+
+async def ndjson(rows: AsyncIterable[dict], adapter: TypeAdapter) -> AsyncIterator[bytes]:
+    """Encode dict rows as newline-delimited JSON, one object per line"""
+    async for chunk in _chunks(rows):
+        yield b"".join(adapter.dump_json([row])[1:-1] + b"\n" for row in chunk)
+
+async def ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream (e.g. request.stream()) into NDJSON lines"""
+    buffer = b""
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+
+    if buffer:
+        yield buffer
@@ -0,0 +1,94 @@
+"""Tests run the app in-process against a throwaway SQLite database,
+migrated to head. Settings are read from the environment at import time,
+so they are set here, before anything imports the app.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+_TMP = tempfile.mkdtemp(prefix="user-post-api-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("REPLICA_DATABASE_URLS", None)
+os.environ.pop("RESPONSE_CACHE_URL", None)
+os.environ.pop("LOGIN_RATE_LIMIT_URL", None)
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["REAPER_INTERVAL_SECONDS"] = "0"
+os.environ["STARTUP_WARMUP"] = "false"
+# every test client comes from one address; per-account limits stay on
+os.environ["LOGIN_RATE_LIMIT_PER_IP"] = "0"
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# alembic before the app: env.py imports the models itself
+_alembic = Config()
+_alembic.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+command.upgrade(_alembic, "head")
+
+import cache
+import crud
+import database
+import main
+from models import Post, User
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture
+def no_response_cache(monkeypatch):
+    """Every read goes to the database"""
+    monkeypatch.setattr(crud, "response_cache", cache.ResponseCache("responses", cache.MemoryBackend(), ttl=0))
+
+# autouse: seeded first, they are the lowest ids and the first pages of
+# /users/, whatever users other tests sign up
+@pytest.fixture(scope="session", autouse=True)
+def users() -> list[int]:
+    """Ids of 120 users with 3 posts each, inserted once for the session"""
+    with database.SessionLocal() as session:
+        created = [
+            User(
+                name=f"seed {index}",
+                email=f"seed{index}@example.com",
+                password="x",
+                post_count=3,
+                posts=[Post(title=f"post {index}.{n}", content="seeded") for n in range(3)],
+            )
+            for index in range(120)
+        ]
+        session.add_all(created)
+        session.commit()
+        return [user.id for user in created]
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Statements the async engine sends while the block runs"""
+    engine = engine or database.async_engine.sync_engine
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def signup(client, email: str, password: str = "password123") -> tuple[int, str]:
+    """Create a user through the API and log in; (id, access token)"""
+    response = client.post("/users/", json={"name": "test", "email": email, "password": password})
+    assert response.status_code == 201, response.text
+    login = client.post("/login", data={"username": email, "password": password})
+    assert login.status_code == 200, login.text
+    return response.json()["id"], login.json()["access_token"]
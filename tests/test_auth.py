@@ -0,0 +1,37 @@
+import asyncio
+
+import security
+from conftest import signup
+
+
+def test_token_of_deleted_user_cannot_post(client):
+    user_id, token = signup(client, "deleted-author@example.com")
+    assert client.delete(f"/users/{user_id}").status_code == 204
+
+    # the token is still valid; the foreign key is what notices
+    response = client.post(
+        "/posts/",
+        json={"title": "orphan", "content": "x"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 401
+
+def test_principal_is_resolved_on_the_event_loop(client, monkeypatch):
+    """Not in the threadpool, where requests would race on the verify cache"""
+    _, token = signup(client, "principal-loop@example.com")
+    verify = security.token_service.verify
+    loops = []
+
+    def spy(token: str):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return verify(token)
+
+    monkeypatch.setattr(security.token_service, "verify", spy)
+    response = client.get("/posts/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert loops and None not in loops
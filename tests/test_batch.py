@@ -0,0 +1,39 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import crud
+import database
+from conftest import count_queries
+from models import Post
+
+
+def test_concurrent_loads_collapse_into_one_query_per_chunk(users):
+    async def run():
+        # an engine of its own: pooled aiosqlite connections belong to the loop that opened them
+        engine = database.make_async_engine()
+        try:
+            async with async_sessionmaker(bind=engine)() as session:
+                post_ids = list(await session.scalars(
+                    select(Post.id).where(Post.user_id.in_(users[:2])).order_by(Post.id)
+                ))
+                loader = crud.BatchLoader(lambda ids: crud.get_posts_by_ids(session, ids), chunk_size=4)
+
+                # separate load() calls, as independent resolvers would make them;
+                # a repeated id and one that doesn't exist
+                with count_queries(engine.sync_engine) as statements:
+                    rows = await asyncio.gather(*(loader.load(post_id) for post_id in [*post_ids, post_ids[0], 0]))
+
+                return post_ids, rows, statements
+        finally:
+            await engine.dispose()
+
+    post_ids, rows, statements = asyncio.run(run())
+
+    assert [row["id"] for row in rows[:len(post_ids)]] == post_ids
+    assert rows[-2] is rows[0]
+    assert rows[-1] is None
+    # 7 distinct ids in chunks of 4
+    assert len(statements) == 2
+    assert all("WHERE posts.id IN" in statement for statement in statements)
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import cache
+from conftest import signup
+
+
+def test_cancelled_leader_does_not_fail_the_waiters():
+    async def run():
+        responses = cache.ResponseCache("test", cache.MemoryBackend(), ttl=30)
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(60)
+
+        async def fast():
+            return {}, b"body"
+
+        leader = asyncio.create_task(responses.load("key", slow))
+        await started.wait()
+        waiters = [asyncio.create_task(responses.load("key", fast)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        # the leader's client disconnects
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(run()) == [({}, b"body")] * 3
+
+def test_leader_error_reaches_the_waiters():
+    async def run():
+        responses = cache.ResponseCache("test", cache.MemoryBackend(), ttl=30)
+        release = asyncio.Event()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await release.wait()
+            raise RuntimeError("database down")
+
+        tasks = [asyncio.create_task(responses.load("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True), calls
+
+    results, calls = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 1
+
+def test_post_writes_leave_unrelated_entries_cached(client, users):
+    """A new post invalidates its author, its own id and the stats, not other users' batches"""
+    author, token = signup(client, "scoped-writes@example.com")
+    auth = {"Authorization": f"Bearer {token}"}
+    first = client.post("/posts/", json={"title": "first", "content": "x"}, headers=auth).json()["id"]
+
+    others = f"/users/batch?ids={users[0]},{users[1]}"
+    mine = f"/users/batch?ids={author}"
+    # post ids are never reused, so the next post takes first + 1
+    next_post = f"/posts/batch?ids={first + 1}"
+    for url in (others, mine, next_post, "/stats/users"):
+        assert client.get(url).headers["x-cache"] == "MISS"
+        assert client.get(url).headers["x-cache"] == "HIT"
+    assert client.get(next_post).json()["missing"] == [first + 1]
+
+    assert client.post("/posts/", json={"title": "second", "content": "x"}, headers=auth).status_code == 201
+
+    assert client.get(others).headers["x-cache"] == "HIT"
+    for url in (mine, next_post, "/stats/users"):
+        assert client.get(url).headers["x-cache"] == "MISS", url
+    assert [post["id"] for post in client.get(next_post).json()["items"]] == [first + 1]
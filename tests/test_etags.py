@@ -0,0 +1,56 @@
+import pagination
+from conftest import count_queries, signup
+
+
+def test_user_etag_covers_post_count(client):
+    """A post beyond posts_limit changes only post_count in the body; the ETag must change too"""
+    user_id, token = signup(client, "etag-author@example.com")
+    auth = {"Authorization": f"Bearer {token}"}
+    for title in ("first", "second"):
+        assert client.post("/posts/", json={"title": title, "content": "x"}, headers=auth).status_code == 201
+
+    before = client.get(f"/users/{user_id}", params={"posts_limit": 1})
+    assert before.json()["post_count"] == 2
+    etag = before.headers["etag"]
+
+    assert client.post("/posts/", json={"title": "third", "content": "x"}, headers=auth).status_code == 201
+
+    revalidated = client.get(f"/users/{user_id}", params={"posts_limit": 1}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 200
+    assert revalidated.json()["post_count"] == 3
+    assert revalidated.headers["etag"] != etag
+
+def test_etags_change_when_the_newest_post_is_replaced(client, no_response_cache):
+    """Deleting the newest post and creating another must not bring back the old ETags"""
+    user_id, token = signup(client, "etag-replace@example.com")
+    auth = {"Authorization": f"Bearer {token}"}
+    for title in ("kept", "replaced"):
+        created = client.post("/posts/", json={"title": title, "content": "x"}, headers=auth)
+        assert created.status_code == 201
+    newest = created.json()["id"]
+
+    urls = [
+        f"/users/{user_id}",
+        f"/users/{user_id}/posts",
+        f"/posts/?limit=10&after={pagination.encode_cursor(newest - 1)}",
+    ]
+    before = {url: client.get(url) for url in urls}
+
+    assert client.delete(f"/posts/{newest}", headers=auth).status_code == 204
+    replacement = client.post("/posts/", json={"title": "replacement", "content": "x"}, headers=auth)
+    assert replacement.status_code == 201
+
+    for url, response in before.items():
+        revalidated = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+        assert revalidated.status_code == 200, url
+        assert "replacement" in revalidated.text
+
+def test_unpaged_stream_skips_the_watermark(client, no_response_cache):
+    """The first byte of GET /posts/ must not wait for an aggregate over every post"""
+    with count_queries() as statements:
+        response = client.get("/posts/", headers={"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert response.headers["vary"] == "Accept"
+    assert not any("count(*)" in statement for statement in statements)
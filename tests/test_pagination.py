@@ -0,0 +1,25 @@
+import pytest
+
+import pagination
+
+
+def test_oversized_page_size_is_clamped(client, users, no_response_cache):
+    """page_size predates MAX_PAGE_SIZE, so a bigger one still gets a page"""
+    response = client.get("/users/", params={"page_size": pagination.MAX_PAGE_SIZE + 1, "posts_limit": 0})
+    assert response.status_code == 200
+    assert len(response.json()) == pagination.MAX_PAGE_SIZE
+
+    response = client.get(f"/users/{users[0]}/posts", params={"page_size": 0})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+@pytest.mark.parametrize("url, params, param", [
+    ("/users/", {}, "limit"),
+    ("/posts/search", {"q": "post"}, "limit"),
+    ("/stats/users", {}, "top"),
+])
+@pytest.mark.parametrize("value", [0, pagination.MAX_PAGE_SIZE + 1])
+def test_out_of_range_limit_is_rejected(client, url, params, param, value):
+    response = client.get(url, params={**params, param: value})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", param]
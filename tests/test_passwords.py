@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import crud
+import database
+import schemas
+import security
+from conftest import signup
+
+# 72 characters, 144 bytes in UTF-8: within max_length, beyond bcrypt's limit
+LONG_PASSWORD = "é" * 72
+
+
+def test_password_over_72_bytes_is_rejected_by_the_schema(client):
+    response = client.post("/users/", json={"name": "x", "email": "long@example.com", "password": LONG_PASSWORD})
+    assert response.status_code == 422
+
+def test_login_with_password_over_72_bytes(client):
+    signup(client, "long-login@example.com")
+    login = client.post("/login", data={"username": "long-login@example.com", "password": LONG_PASSWORD})
+    assert login.status_code == 400
+
+def test_passwords_are_cut_at_72_bytes():
+    hashed = security.hash_password("é" * 36 + "tail")
+    assert security.verify_password("é" * 36, hashed)
+
+def test_bulk_import_reports_password_over_72_bytes_per_row(client):
+    _, token = signup(client, "bulk-importer@example.com")
+    rows = [
+        {"name": "ok", "email": "bulk-ok@example.com", "password": "password123"},
+        {"name": "long", "email": "bulk-long@example.com", "password": LONG_PASSWORD},
+    ]
+    response = client.post(
+        "/users/bulk",
+        content="\n".join(json.dumps(row) for row in rows),
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 1
+    assert [error["line"] for error in result["errors"]] == [2]
+
+def test_bulk_create_users_turns_a_hashing_failure_into_a_row_error(monkeypatch):
+    hash_password = security.hash_password
+
+    def failing(password: str) -> str:
+        if password == "rejected":
+            raise ValueError("password rejected by bcrypt")
+        return hash_password(password)
+
+    monkeypatch.setattr(security, "hash_password", failing)
+
+    async def run():
+        # an engine of its own: pooled aiosqlite connections belong to the loop that opened them
+        engine = database.make_async_engine()
+        try:
+            async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+                return await crud.bulk_create_users(session, [
+                    schemas.UserCreate(name="ok", email="hash-ok@example.com", password="password123"),
+                    schemas.UserCreate(name="bad", email="hash-bad@example.com", password="rejected"),
+                ])
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == {1: "password rejected by bcrypt"}
+
+def test_unknown_email_is_checked_against_a_hash_of_the_stored_cost(client, monkeypatch):
+    """Login for an unknown email must run bcrypt, at the cost the stored hashes have"""
+    signup(client, "known-cost@example.com")
+    # BCRYPT_ROUNDS raised since the stored hashes were made
+    monkeypatch.setattr(security, "BCRYPT_ROUNDS", security.BCRYPT_ROUNDS + 1)
+    monkeypatch.setattr(security, "_stored_rounds", security.BCRYPT_ROUNDS)
+
+    checked = []
+    verify_password = security.verify_password
+
+    def spy(plain_password, hashed):
+        checked.append(hashed)
+        return verify_password(plain_password, hashed)
+
+    monkeypatch.setattr(security, "verify_password", spy)
+
+    for email in ("known-cost@example.com", "unknown-cost@example.com"):
+        response = client.post("/login", data={"username": email, "password": "wrong-password"})
+        assert response.status_code == 400
+
+    stored, dummy = checked
+    assert dummy != stored
+    assert security._rounds_of(dummy) == security._rounds_of(stored) == security.BCRYPT_ROUNDS - 1
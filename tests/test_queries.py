@@ -0,0 +1,167 @@
+import asyncio
+import re
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import crud
+import database
+import schemas
+from conftest import count_queries
+from models import Post, User
+
+
+@pytest.mark.parametrize("posts_limit", [None, 2])
+def test_user_list_query_count_is_constant(client, users, no_response_cache, posts_limit):
+    """One query for the page of users, one for all their posts, whatever the page size"""
+    counts = {}
+    for page_size in (1, 100):
+        params = {"page_size": page_size}
+        if posts_limit is not None:
+            params["posts_limit"] = posts_limit
+
+        with count_queries() as statements:
+            response = client.get("/users/", params=params)
+
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) == page_size
+        assert all(len(user["posts"]) == (posts_limit or 3) for user in page)
+        counts[page_size] = len(statements)
+
+    assert counts == {1: 2, 100: 2}
+
+
+def _plans(statements: list[tuple[str, tuple]]) -> dict[str, list[str]]:
+    """EXPLAIN QUERY PLAN of each captured statement (whitespace collapsed), on the migrated test database"""
+    plans = {}
+    connection = sqlite3.connect(database.engine.url.database)
+    try:
+        for statement, parameters in statements:
+            rows = connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            plans[" ".join(statement.split())] = [row[-1] for row in rows]
+    finally:
+        connection.close()
+    return plans
+
+def _tables() -> set[str]:
+    connection = sqlite3.connect(database.engine.url.database)
+    try:
+        return {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        connection.close()
+
+# the scans some statements can't avoid, by statement prefix
+EXPECTED_SCANS = {
+    # page=N without a cursor: OFFSET walks the id order up to the page; keyset pages seek
+    "SELECT users.id, users.name, users.email, users.post_count FROM users ORDER BY users.id LIMIT ? OFFSET ?":
+        "SCAN users",
+    # the totals of GET /stats/users count every user, from the index alone
+    "SELECT count(users.id) AS count_1, coalesce(sum(users.post_count), ?)":
+        "SCAN users USING COVERING INDEX ix_users_post_count",
+    # top authors: the index from its high end, stopping after LIMIT rows
+    "SELECT users.id, users.name, users.post_count FROM users ORDER BY users.post_count DESC":
+        "SCAN users USING INDEX ix_users_post_count",
+}
+
+def _full_scans(plans: dict[str, list[str]], tables: set[str]) -> dict[str, list[str]]:
+    """Plan lines that read a whole table, other than EXPECTED_SCANS"""
+    scans = {}
+    for statement, plan in plans.items():
+        expected = [scan for prefix, scan in EXPECTED_SCANS.items() if statement.startswith(prefix)]
+        lines = []
+        for line in plan:
+            match = re.match(r"SCAN (\S+)(?: VIRTUAL TABLE INDEX \d+:(\S*))?", line)
+            if not match or match.group(1) not in tables or line in expected:
+                continue
+            # an FTS5 scan constrained by MATCH (M) or rowid (=) reads the index, not the table
+            if match.group(2) and re.search(r"[M=]", match.group(2)):
+                continue
+            lines.append(line)
+        if lines:
+            scans[statement] = lines
+    return scans
+
+def test_crud_queries_use_indexes(users):
+    """No crud query reads a whole table, except the few in EXPECTED_SCANS"""
+
+    async def run():
+        # an engine of its own: pooled aiosqlite connections belong to the loop that opened them
+        engine = database.make_async_engine()
+        make_session = async_sessionmaker(bind=engine, expire_on_commit=False)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany:
+                statements.append((statement, tuple(parameters)))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            async with make_session() as session:
+                user_id = users[0]
+                # listings, their watermarks and the lookups behind them
+                await crud.get_posts_by_user(session, user_id, skip=1, limit=2)
+                await crud.get_posts_by_user(session, user_id, limit=2, after_id=0)
+                await crud.get_posts_by_user_watermark(session, user_id, limit=2, after_id=0)
+                await crud.get_user_by_id(session, user_id, load_posts=True)
+                await crud.get_user_by_id(session, user_id, load_posts=True, posts_limit=2)
+                await crud.get_user_watermark(session, user_id, posts_limit=2)
+                await crud.get_user_by_email(session, "seed1@example.com")
+                await crud.get_users(session, 20, 10, posts_limit=2)
+                await crud.get_users(session, 0, 10, after_id=0)
+                await crud.get_posts(session, 10, after_id=5)
+                await crud.get_posts_watermark(session, 10, after_id=5)
+                async for _ in crud.stream_posts(session, after_id=5, batch_size=100):
+                    pass
+
+                # batches, stats and search
+                await crud.get_users_by_ids(session, users[:3], posts_limit=2)
+                await crud.get_users_by_ids(session, users[:3])
+                await crud.get_posts_by_ids(session, [1, 2, 3])
+                await crud.get_user_stats(session, 10)
+                await crud.search_posts(session, "post", 5)
+                await crud.search_posts(session, "post", 5, after=(-1.0, 3))
+
+                # writes
+                post = await crud.create_post_in_db(session, schemas.PostCreate(title="t", content="x"), user_id)
+                await crud.delete_post(session, post.id, user_id)
+                await crud.bulk_create_users(session, [
+                    schemas.UserCreate(name="bulk", email="bulk-plan@example.com", password="password123")
+                ])
+                await crud.bulk_create_posts(session, [schemas.PostImport(title="t", content="x", user_id=user_id)])
+                await crud.reconcile_post_counts(session, batch_size=50)
+
+                # refresh tokens: lookup, rotation, reuse of a rotated token, logout
+                token = await crud.create_refresh_token(session, user_id)
+                await crud.get_refresh_token_owner(session, token)
+                await crud.rotate_refresh_token(session, token)
+                await crud.rotate_refresh_token(session, token)
+                await crud.delete_refresh_token(session, await crud.create_refresh_token(session, user_id))
+
+                doomed = User(name="doomed", email="doomed@example.com", password="x", post_count=1,
+                              posts=[Post(title="doomed", content="x")])
+                session.add(doomed)
+                await session.commit()
+                await crud.create_refresh_token(session, doomed.id)
+                await crud.revoke_user_refresh_tokens(session, doomed.id)
+                await crud.create_refresh_token(session, doomed.id)
+
+            # a fresh session, so the ORM cascade has to load the posts and tokens it deletes
+            async with make_session() as session:
+                await crud.delete_user(session, doomed.id)
+                await crud.delete_expired_refresh_tokens(session)
+        finally:
+            await engine.dispose()
+
+        return statements
+
+    plans = _plans(asyncio.run(run()))
+    tables = _tables()
+
+    read = {match for plan in plans.values() for line in plan for match in re.findall(r"\b(?:SCAN|SEARCH) (\w+)", line)}
+    assert {"users", "posts", "refresh_tokens", "posts_fts"} <= read
+    assert any(statement.startswith("DELETE FROM posts") for statement in plans)
+    assert any(statement.startswith("DELETE FROM refresh_tokens") for statement in plans)
+    assert not _full_scans(plans, tables)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import cache
+import ratelimit
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # the start of a window
+    clock = Clock(1_000_000 * 60.0)
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+@pytest.fixture
+def login_limit(monkeypatch, clock):
+    """At most 3 login attempts per account and minute, on a fresh backend"""
+    limiter = ratelimit.SlidingWindowLimiter("login:user", cache.MemoryBackend(), 3, 60)
+    monkeypatch.setattr(ratelimit, "login_by_user", limiter)
+    return limiter
+
+
+def hits(limiter: ratelimit.SlidingWindowLimiter, key: str, count: int) -> list:
+    async def run():
+        return [await limiter.hit(key) for _ in range(count)]
+    return asyncio.run(run())
+
+def test_window_slides(clock):
+    limiter = ratelimit.SlidingWindowLimiter("test", cache.MemoryBackend(), 4, 60)
+    assert hits(limiter, "key", 4) == [None] * 4
+    assert hits(limiter, "key", 1) == [60.0]
+
+    # half into the next window, the 5 hits of the last one weigh 2.5
+    clock.now += 90
+    assert hits(limiter, "key", 2) == [None, 30.0]
+
+    # once a whole window has passed without hits, nothing is left of them
+    clock.now += 90
+    assert hits(limiter, "key", 4) == [None] * 4
+
+def test_failed_logins_get_429_per_account(client, login_limit, clock):
+    for email in ("limited@example.com", "unlimited@example.com"):
+        client.post("/users/", json={"name": "x", "email": email, "password": "password123"})
+
+    def attempt(email: str):
+        return client.post("/login", data={"username": email, "password": "wrong-password"})
+
+    assert [attempt("limited@example.com").status_code for _ in range(3)] == [400] * 3
+    blocked = attempt("Limited@Example.com ")
+    assert blocked.status_code == 429
+    assert blocked.headers["retry-after"] == "60"
+
+    # counted per account
+    assert attempt("unlimited@example.com").status_code == 400
+
+    # once the window has passed, the account may try again
+    clock.now += 120
+    assert attempt("limited@example.com").status_code == 400
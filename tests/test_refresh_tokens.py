@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+import database
+import security
+from conftest import signup
+
+
+def login(client, email: str, password: str = "password123") -> dict:
+    response = client.post("/login", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def refresh(client, token: str):
+    return client.post("/refresh", params={"refresh_token": token})
+
+
+def test_rotation_refuses_the_old_token(client):
+    signup(client, "rotate@example.com")
+    old = login(client, "rotate@example.com")["refresh_token"]
+
+    rotated = refresh(client, old)
+    assert rotated.status_code == 200
+    new = rotated.json()["refresh_token"]
+    assert new != old
+
+    assert refresh(client, old).status_code == 401
+
+def test_reused_token_revokes_its_family(client):
+    signup(client, "reuse@example.com")
+    stolen = login(client, "reuse@example.com")["refresh_token"]
+    other_session = login(client, "reuse@example.com")["refresh_token"]
+
+    # the legitimate client rotates twice, then the stolen token is replayed
+    first = refresh(client, stolen).json()["refresh_token"]
+    current = refresh(client, first).json()["refresh_token"]
+    assert refresh(client, stolen).status_code == 401
+
+    # every token descended from that login is gone, other logins are not
+    assert refresh(client, current).status_code == 401
+    assert refresh(client, other_session).status_code == 200
+
+def test_logout_all_ends_every_session(client):
+    _, access = signup(client, "logout-all@example.com")
+    sessions = [login(client, "logout-all@example.com")["refresh_token"] for _ in range(2)]
+
+    response = client.post("/logout/all", headers={"Authorization": f"Bearer {access}"})
+    assert response.status_code == 200
+
+    assert [refresh(client, token).status_code for token in sessions] == [401, 401]
+
+def test_logout_ends_only_its_own_session(client):
+    signup(client, "logout@example.com")
+    ended, kept = (login(client, "logout@example.com")["refresh_token"] for _ in range(2))
+    rotated = refresh(client, ended).json()["refresh_token"]
+
+    # logging out with any token of a session ends the whole session
+    assert client.post("/logout", params={"refresh_token": ended}).status_code == 200
+    assert refresh(client, rotated).status_code == 401
+    assert refresh(client, kept).status_code == 200
+
+@pytest.mark.parametrize("hashing", [False, True])
+def test_stored_form_of_refresh_tokens(client, monkeypatch, hashing):
+    monkeypatch.setattr(security, "REFRESH_TOKEN_HASHING", hashing)
+    email = f"stored-{hashing}@example.com".lower()
+    user_id, _ = signup(client, email)
+    token = login(client, email)["refresh_token"]
+
+    connection = sqlite3.connect(database.engine.url.database)
+    try:
+        stored = {row[0] for row in connection.execute("SELECT token FROM refresh_tokens WHERE user_id = ?", (user_id,))}
+    finally:
+        connection.close()
+
+    assert security.refresh_token_storage_key(token) in stored
+    assert (token in stored) is not hashing
+    # either form is accepted
+    assert refresh(client, token).status_code == 200
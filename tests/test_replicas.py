@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import database
+import replicas
+from conftest import signup
+
+
+@pytest.fixture
+def lagging_replica(client, monkeypatch, tmp_path):
+    """Call to add one replica: a copy of the database as it is then, which never catches up"""
+    engines = []
+
+    def make():
+        path = str(tmp_path / "replica.db")
+        source, target = sqlite3.connect(database.engine.url.database), sqlite3.connect(path)
+        source.backup(target)
+        target.close()
+        source.close()
+
+        engine = database.make_async_engine(f"sqlite+aiosqlite:///{path}")
+        engines.append(engine)
+        monkeypatch.setattr(replicas, "replica_engines", [engine])
+        monkeypatch.setattr(replicas, "replica_sessions", [
+            async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        ])
+        monkeypatch.setattr(replicas, "_open", [0])
+        monkeypatch.setattr(replicas, "_reads", [0])
+
+    yield make
+
+    for engine in engines:
+        client.portal.call(engine.dispose)
+
+def test_read_your_writes_bypasses_response_cache(client, lagging_replica):
+    user_id, _ = signup(client, "read-your-writes@example.com")
+    lagging_replica()
+
+    # client A renames the user and gets the read-your-writes cookie
+    assert client.put(f"/users/{user_id}", json={"name": "renamed"}).status_code == 200
+    cookie = client.cookies[replicas.READ_PRIMARY_COOKIE]
+
+    # a client without the cookie reads the replica's old name, and caches it
+    client.cookies.clear()
+    stale = client.get(f"/users/{user_id}")
+    assert stale.json()["name"] == "test"
+    assert stale.headers["x-cache"] == "MISS"
+
+    # client A must still see its own write
+    client.cookies.set(replicas.READ_PRIMARY_COOKIE, cookie)
+    fresh = client.get(f"/users/{user_id}")
+    assert fresh.json()["name"] == "renamed"
+    assert fresh.headers["x-cache"] == "BYPASS"
@@ -0,0 +1,101 @@
+from sqlalchemy import text
+
+import database
+from conftest import signup
+
+
+def create_posts(client, email: str, *posts: tuple[str, str]) -> tuple[str, list[int]]:
+    """Sign up and post each (title, content); returns the token and the post ids"""
+    _, token = signup(client, email)
+    auth = {"Authorization": f"Bearer {token}"}
+    ids = []
+    for title, content in posts:
+        created = client.post("/posts/", json={"title": title, "content": content}, headers=auth)
+        assert created.status_code == 201
+        ids.append(created.json()["id"])
+    return token, ids
+
+def search(client, q: str, **params) -> list[int]:
+    response = client.get("/posts/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [row["id"] for row in response.json()]
+
+def test_title_matches_rank_first(client):
+    # the same words in each, the match in the content of one and the title of the other
+    _, (in_content, in_title) = create_posts(
+        client,
+        "search-rank@example.com",
+        ("plain notes", "zephyrine text here"),
+        ("zephyrine notes", "plain text here"),
+    )
+
+    response = client.get("/posts/search", params={"q": "zephyrine"})
+    rows = response.json()
+    assert [row["id"] for row in rows] == [in_title, in_content]
+    assert rows[0]["rank"] < rows[1]["rank"]
+
+def test_every_word_must_match_and_star_matches_a_prefix(client):
+    _, (both, one) = create_posts(
+        client,
+        "search-words@example.com",
+        ("quillback marmoset", "x"),
+        ("quillback only", "x"),
+    )
+
+    assert search(client, "quillback marmoset") == [both]
+    assert sorted(search(client, "quillb*")) == [both, one]
+    # FTS5 syntax is searched for literally, not a 500
+    assert search(client, '"quillback OR (') == []
+
+def test_after_cursor_pages_through_every_match(client):
+    _, ids = create_posts(client, "search-pages@example.com", *[(f"wombatine {n}", "x" * n) for n in range(5)])
+    everything = search(client, "wombatine")
+    assert sorted(everything) == sorted(ids)
+
+    seen, params = [], {"q": "wombatine", "limit": 2}
+    while True:
+        response = client.get("/posts/search", params=params)
+        assert response.status_code == 200
+        seen += [row["id"] for row in response.json()]
+        if "x-next-cursor" not in response.headers:
+            break
+        params["after"] = response.headers["x-next-cursor"]
+
+    assert seen == everything
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/posts/search", params={"q": "anything", "after": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_snippet_is_escaped_and_highlighted(client):
+    create_posts(client, "search-snippet@example.com", ("title", "<b>tamarinda</b> & co"))
+
+    [row] = client.get("/posts/search", params={"q": "tamarinda"}).json()
+    assert row["snippet"] == "&lt;b&gt;<mark>tamarinda</mark>&lt;/b&gt; &amp; co"
+
+def test_index_follows_inserts_updates_and_deletes(client):
+    token, [post_id] = create_posts(client, "search-sync@example.com", ("okapiline", "first body"))
+    assert search(client, "okapiline") == [post_id]
+
+    # no route edits a post; the trigger has to cover any UPDATE all the same
+    with database.SessionLocal() as session:
+        session.execute(
+            text("UPDATE posts SET title = 'capybarine', content = 'second body' WHERE id = :id"),
+            {"id": post_id}
+        )
+        session.commit()
+    assert search(client, "okapiline") == []
+    assert search(client, "capybarine") == [post_id]
+    assert search(client, "second body") == [post_id]
+
+    assert client.delete(f"/posts/{post_id}", headers={"Authorization": f"Bearer {token}"}).status_code == 204
+    assert search(client, "capybarine") == []
+
+def test_deleting_a_user_removes_their_posts_from_the_index(client):
+    user_id, token = signup(client, "search-cascade@example.com")
+    auth = {"Authorization": f"Bearer {token}"}
+    post_id = client.post("/posts/", json={"title": "numbatish", "content": "x"}, headers=auth).json()["id"]
+    assert search(client, "numbatish") == [post_id]
+
+    assert client.delete(f"/users/{user_id}", headers=auth).status_code == 204
+    assert search(client, "numbatish") == []
@@ -0,0 +1,153 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Optional
+
+import jwt
+from jwt.algorithms import get_default_algorithms, has_crypto
+
+from cache import TTLCache
+
+
+ASYMMETRIC_ALGORITHMS = {"ES256", "EdDSA"}
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    """A JWT key with its key objects parsed once, at startup.
+
+    `signing_key` is None for verify-only keys (e.g. a public key of
+    another node, or a retired key kept until its tokens expire).
+    """
+    kid: str
+    algorithm: str
+    signing_key: Any
+    verifying_key: Any
+
+    @classmethod
+    def load(
+        cls,
+        kid: str,
+        algorithm: str,
+        secret: Optional[str] = None,
+        private_key: Optional[str] = None,
+        public_key: Optional[str] = None
+    ) -> "SigningKey":
+        if algorithm in ASYMMETRIC_ALGORITHMS and not has_crypto:
+            raise RuntimeError(f"JWT key {kid!r} uses {algorithm}, install 'cryptography' to use it")
+
+        prepare = get_default_algorithms()[algorithm].prepare_key
+
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            signing = prepare(private_key) if private_key else None
+            verifying = prepare(public_key) if public_key else signing.public_key()
+            return cls(kid, algorithm, signing, verifying)
+
+        key = prepare(secret)
+        return cls(kid, algorithm, key, key)
+
+
+class TokenService:
+    """Signs and verifies access tokens.
+
+    Tokens are signed with the active key and carry its `kid` header, so
+    keys can be rotated by adding the new key, switching the active kid,
+    and dropping the old key once its tokens have expired. Recently
+    verified tokens are kept in a bounded LRU until their `exp`, so a
+    client repeating the same bearer token skips signature and claim
+    checks. The cache is not locked: call verify from one thread (the
+    event loop).
+    """
+
+    def __init__(self, keys: list[SigningKey], active_kid: str, cache_size: int = 10000):
+        self.keys = {key.kid: key for key in keys}
+        self.active = self.keys[active_kid]
+        if self.active.signing_key is None:
+            raise ValueError(f"active JWT key {active_kid!r} has no private key")
+
+        self._verified = TTLCache(maxsize=cache_size, ttl=0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @classmethod
+    def from_env(cls, default_secret: str, default_algorithm: str) -> "TokenService":
+        """Keys from JWT_KEYS, falling back to one key built from the module secret.
+
+        JWT_KEYS is a JSON list such as
+            [{"kid": "2026-10", "alg": "HS256", "secret": "..."},
+             {"kid": "ed-1", "alg": "EdDSA", "private_key_file": "ed.pem"},
+             {"kid": "ed-0", "alg": "EdDSA", "public_key_file": "ed-old.pub"}]
+        and JWT_ACTIVE_KID names the one used for signing (default: first).
+        """
+        config = json.loads(os.getenv("JWT_KEYS", "[]"))
+        if not config:
+            config = [{"kid": "default", "alg": default_algorithm, "secret": default_secret}]
+
+        def read(path: Optional[str]) -> Optional[str]:
+            if not path:
+                return None
+            with open(path) as file:
+                return file.read()
+
+        keys = [
+            SigningKey.load(
+                entry["kid"],
+                entry["alg"],
+                secret=entry.get("secret"),
+                private_key=entry.get("private_key") or read(entry.get("private_key_file")),
+                public_key=entry.get("public_key") or read(entry.get("public_key_file")),
+            )
+            for entry in config
+        ]
+
+        return cls(
+            keys,
+            os.getenv("JWT_ACTIVE_KID", keys[0].kid),
+            cache_size=int(os.getenv("JWT_VERIFY_CACHE_SIZE", "10000"))
+        )
+
+    def sign(self, claims: dict, expires_in: timedelta) -> str:
+        payload = {**claims, "exp": int(time.time() + expires_in.total_seconds())}
+        return jwt.encode(
+            payload,
+            self.active.signing_key,
+            algorithm=self.active.algorithm,
+            headers={"kid": self.active.kid}
+        )
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Claims of a valid token, or None if it is invalid or expired"""
+        cached = self._verified.get(token)
+        if cached is not None:
+            self.cache_hits += 1
+            return dict(cached)
+        self.cache_misses += 1
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            # tokens from before key ids were introduced are signed with the active key
+            key = self.keys.get(kid) if kid else self.active
+            if key is None:
+                return None
+
+            claims = jwt.decode(token, key.verifying_key, algorithms=[key.algorithm])
+        except jwt.PyJWTError:
+            return None
+
+        # only tokens with an expiry are cached, and only until it
+        expires_in = claims.get("exp", 0) - time.time()
+        if expires_in > 0:
+            self._verified.set(token, claims, ttl=expires_in)
+
+        return dict(claims)
+
+    def stats(self) -> dict:
+        return {
+            "active_kid": self.active.kid,
+            "keys": len(self.keys),
+            "verify_cache_hits": self.cache_hits,
+            "verify_cache_misses": self.cache_misses,
+            "verify_cache_size": len(self._verified),
+        }